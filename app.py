@@ -1,22 +1,50 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Response, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
 import json
+import logging
 import time
+import asyncio
 import random
 from typing import Dict, Any, List
 from datetime import datetime
+import os
 import pytz
 from check_data_needs import check_for_additional_data
-from retrieve_astro_chart import get_llm_formatted_rules_string
-from retrieve_index_on_birth_chart import get_matching_rules_by_planet_age_time
+from retrieve_astro_chart import get_rendered_rules
+from prompt_assembler import assemble_prompt_rules
 from retrieve_index_of_similar_question import get_relevant_excel_indices
-from prediction_of_user_query import predict_user_query
+from prediction_of_user_query import ERROR_MESSAGE, PredictionStreamInterrupted, predict_user_query, predict_user_query_stream
+from knowledge_bank import get_knowledge_bank, load_knowledge_bank, pinned_knowledge_bank, seconds_until_next_ist_midnight
+from kb_reload import KB_RELOAD_INTERVAL_SECONDS, validate_knowledge_bank, watch_knowledge_bank
+from user_database import user_database
+from session_store import SessionStore
+from chart_precompute import get_chart_rules, schedule_chart_precompute
+from fake_gemini import FakeGenerativeModel, install_fake_gemini
+from metrics import (
+    ACTIVE_WEBSOCKETS, LOG_RECORDS_DROPPED, SESSION_CACHE_BYTES, SESSION_CACHE_MAX_BYTES, SESSION_CACHE_PINNED,
+    SESSION_CACHE_RESIDENT, STAGE_SECONDS, TURN_SECONDS,
+    MULTIPROC_DIR, mark_worker_stopped, refresh_gauges_periodically, render_metrics, stage_timer, timed_stage,
+    track_gauge,
+)
+from logging_setup import configure_logging, current_session, dropped_records, stop_logging
+
+configure_logging()
+logger = logging.getLogger(__name__)
 
 # --- Global Configurations & Constants ---
 app = FastAPI()
 PLANETS = ["Sun", "Moon", "Mars", "Mercury", "Jupiter", "Venus", "Saturn", "Rahu", "Ketu"]
 IST = pytz.timezone('Asia/Kolkata')
 
+# Prediction text ko 'llm_response_chunk' messages ke roop mein stream karo (STREAM_PREDICTIONS=0 se band).
+STREAM_PREDICTIONS = os.getenv("STREAM_PREDICTIONS", "1") == "1"
+
+# Load testing ke liye: FAKE_GEMINI=1 par saare Gemini calls offline fake model par jaate hain
+# (latency / error rate FAKE_GEMINI_* env vars se, dekho fake_gemini.py).
+if os.getenv("FAKE_GEMINI") == "1":
+    install_fake_gemini(FakeGenerativeModel.from_env())
+    logger.warning("FAKE_GEMINI=1 -- using the offline fake Gemini model, predictions are not real.")
+
 PREDICTION_TEMPLATES = [
     "Aapke liye aane wala samay aarthik roop se behtar ho sakta hai. Nivesh karne se pehle sochna zaroori hai.",
     "Swasthya par vishesh dhyan dein. Choti-moti pareshaniyon ko nazarandaaz na karein.",
@@ -28,8 +56,64 @@ PREDICTION_TEMPLATES = [
     "Aapki rachanatmak (creative) shakti badhegi. Naye ideas par kaam karne ka ye sahi samay hai."
 ]
 
-# In-memory data store
-user_data_store: Dict[str, Dict[str, Any]] = {}
+# Session / profile store: shared SQLite (WAL) sabhi uvicorn workers ke beech, aur har worker mein
+# ek bounded read cache. Version stamp se pata chalta hai ki kisi doosre worker ne record badla hai.
+user_data_store = SessionStore(user_database)
+track_gauge(SESSION_CACHE_RESIDENT, lambda: user_data_store.cache.resident_count)
+track_gauge(SESSION_CACHE_BYTES, lambda: user_data_store.cache.resident_bytes)
+track_gauge(SESSION_CACHE_PINNED, lambda: user_data_store.cache.stats()["pinned"])
+track_gauge(SESSION_CACHE_MAX_BYTES, lambda: user_data_store.cache.max_bytes)
+track_gauge(LOG_RECORDS_DROPPED, dropped_records)
+
+
+async def refresh_rendered_rules_daily():
+    # IST midnight ke turant baad naye din ke rule blocks render karo, taaki pehle sawaal ko wait na karna pade.
+    while True:
+        await asyncio.sleep(seconds_until_next_ist_midnight() + 1)
+        try:
+            await asyncio.to_thread(get_rendered_rules)
+        except Exception as e:
+            logger.exception("Daily rule pre-render failed: %s", e)
+
+
+@app.on_event("startup")
+async def load_rules_on_startup():
+    # Excel ko sirf ek baar parse karo; saare retrieval functions isi shared copy ko padhte hain.
+    # Kharab file ho to server yahin fail ho, pehle sawaal par nahi.
+    validate_knowledge_bank(load_knowledge_bank())
+    # Aaj ke liye har rule ka 'Condition/Result' block ek baar bana lo.
+    get_rendered_rules()
+    app.state.render_refresh_task = asyncio.create_task(refresh_rendered_rules_daily())
+    # Excel badalne par rules bina restart ke reload hote hain (KB_RELOAD_INTERVAL_SECONDS=0 se band).
+    app.state.kb_watch_task = None
+    if KB_RELOAD_INTERVAL_SECONDS > 0:
+        app.state.kb_watch_task = asyncio.create_task(watch_knowledge_bank())
+    # PROMETHEUS_MULTIPROC_DIR ho to har worker apne gauges khud file mein likhta hai.
+    app.state.gauge_refresh_task = None
+    if MULTIPROC_DIR:
+        app.state.gauge_refresh_task = asyncio.create_task(refresh_gauges_periodically())
+    await user_database.open()
+
+
+@app.on_event("shutdown")
+async def close_database_on_shutdown():
+    app.state.render_refresh_task.cancel()
+    if app.state.kb_watch_task is not None:
+        app.state.kb_watch_task.cancel()
+    if app.state.gauge_refresh_task is not None:
+        app.state.gauge_refresh_task.cancel()
+    mark_worker_stopped()
+    # Pending writes flush karke hi band karo.
+    await user_database.close()
+    stop_logging()
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    # Prometheus scrape endpoint: stage / Gemini call histograms aur live gauges
+    # (PROMETHEUS_MULTIPROC_DIR ho to saare workers ka jod, warna sirf isi worker ka).
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 
 # --- Pydantic Models for Data Validation (No Change) ---
@@ -49,10 +133,10 @@ class CustomInput(BaseModel):
     custom_data: Dict[str, Any]
 
 
-# --- Database Handling Function (No Change) ---
+# --- Database Handling Function ---
 def save_database(mob: str):
-    print(f"DEBUG: save_database() for {mob}. (Saving is disabled).")
-    pass
+    # Write-behind: record naye version stamp ke saath sirf queue hota hai, background task batch mein SQLite mein likhta hai.
+    user_data_store.save(mob)
 
 # ==============================================================================
 # STAGE 2: THE NEW, SELF-CONTAINED LLM PROCESS
@@ -69,50 +153,62 @@ async def get_next_user_response(websocket: WebSocket) -> Dict:
         if message.get("type") == "submit_custom_input":
             return message
         else:
-            print(f"WARN: Unexpected message type '{message.get('type')}' received. Waiting for 'submit_custom_input'.")
+            logger.warning("Unexpected message type %r received. Waiting for 'submit_custom_input'.", message.get('type'))
             # Yahan hum user ko bata sakte hain ki "Please submit the form."
             continue
 
 
 
-async def llm_process(websocket: Any, mob: str, initial_question: str) -> str:
+async def retrieve_prompt_rules(user_session: Dict[str, Any], question: str):
     """
-    This function manages the entire interaction flow:
-    1. Determines if more data is needed using Gemini's check_for_additional_data.
-    2. Asks questions to the user if needed and collects responses.
-    3. Saves collected data into db_record['on_demand_data'].
-    4. Generates and returns a final prediction.
+    Chart matching, question similarity aur prompt rules ka assembly (dekho prompt_assembler.py).
 
-    Args:
-        websocket: The WebSocket connection for communication.
-        mob (str): User identifier.
-        initial_question (str): The user's initial query.
+    Yeh sirf birth chart aur original question par depend karta hai, follow-up
+    answers par nahi; isliye llm_process ise turn ke shuru mein hi background
+    task ke roop mein start karta hai.
 
     Returns:
-        str: The final astrological prediction text.
+        AssembledRules: Prompt ke liye rules text aur dropped counts.
     """
-    print(f"DEBUG: Entering LLM Process for {mob}.")
-    user_session = user_data_store[mob]
-    db_record = user_session["db_record"]
-    session_state = user_session["session_state"]
+    # Chart rules aksar details save / reconnect ke waqt hi background mein ban chuke hote hain
+    # (dekho chart_precompute.py); tab yeh stage turant return ho jaata hai.
+    chart_rules, question_simillarity_based_retrieved_idx = await asyncio.gather(
+        timed_stage("chart_matching", get_chart_rules(user_session)),
+        timed_stage("similarity", asyncio.to_thread(get_relevant_excel_indices, question)),
+    )
+    logger.debug("Retrieved indices based on planet age and time: %s", chart_rules["indices"])
+    logger.debug("Retrieved indices based on question similarity: %s", question_simillarity_based_retrieved_idx)
+
+    # Saare rules prompt mein nahi jaate: duplicate Results hatao, chart + question score se rank karo,
+    # aur token budget bharne tak sabse kaam ke rules pack karo.
+    with stage_timer("rule_formatting"):
+        assembled_rules = await asyncio.to_thread(
+            assemble_prompt_rules,
+            question,
+            chart_rules["scores"],
+            question_simillarity_based_retrieved_idx,
+        )
+    logger.info(
+        "Prompt rules: %d included (~%d tokens), %d dropped (%d duplicate, %d over budget).",
+        len(assembled_rules.indices), assembled_rules.token_estimate, assembled_rules.dropped,
+        assembled_rules.duplicates_dropped, assembled_rules.over_budget_dropped,
+    )
+    return assembled_rules
 
-    print(f"User Data: {user_data_store}")
-    
-    
-    # Step 1: Check if more data is needed from the user using Gemini
-    print("DEBUG: Checking for additional data needs with Gemini.")
-    
-    # --- CRITICAL FIX: AWAITING THE ASYNC LLM CALL ---
-    # The check_for_additional_data function must be an 'async def' function,
-    # and its internal call to model.generate_content() must be 'await'.
-    data_assessment = await check_for_additional_data(db_record, initial_question)
 
+async def ask_follow_up_questions(websocket: Any, mob: str, data_assessment: Dict[str, Any]):
+    """
+    Gemini ke assessment mein jo sawaal hain, unhe ek-ek karke user se poochta hai
+    aur jawaab db_record['on_demand_data'] mein save karta hai.
+    """
+    db_record = user_data_store[mob]["db_record"]
     if data_assessment.get("data_needs_from_user"):
         question_list = data_assessment.get("question_list", [])
         if question_list:
-            print(f"DEBUG: Gemini recommends asking {len(question_list)} additional questions.")
+            logger.debug("Gemini recommends asking %d additional questions.", len(question_list))
             
             target_interactions = len(question_list)
+            follow_up_started = time.perf_counter()
 
             # Step 2: Ask questions and collect responses (Interaction Loop)
             for i, q_info in enumerate(question_list):
@@ -125,7 +221,7 @@ async def llm_process(websocket: Any, mob: str, initial_question: str) -> str:
                 # Removed display_message_in_chat_bubble from 'message' field
                 # The question will now only appear as the 'label' for the input field.
                 # The 'display_message_in_chat' flag is kept as False to prevent a chat bubble.
-                print(f"DEBUG: Starting interaction {interaction_num}/{target_interactions}. Requesting data for: '{question_text_from_gemini}'")
+                logger.debug("Starting interaction %d/%d. Requesting data for: %r", interaction_num, target_interactions, question_text_from_gemini)
                 
                 action_field_item = {
                     "id": title_key,          
@@ -146,39 +242,65 @@ async def llm_process(websocket: Any, mob: str, initial_question: str) -> str:
                 if "custom_data" in response and title_key in response["custom_data"]:
                     db_record['on_demand_data'][title_key] = response["custom_data"][title_key]
                     save_database(mob)
-                    print(f"DEBUG: Saved custom data for '{title_key}'. Current on_demand_data: {db_record['on_demand_data']}")
+                    logger.debug("Saved custom data for %r. Current on_demand_data: %s", title_key, db_record['on_demand_data'])
                 else:
-                    print(f"DEBUG: No data received for question '{title_key}' from user response: {response}. Skipping save.")
+                    logger.debug("No data received for question %r from user response: %s. Skipping save.", title_key, response)
+            STAGE_SECONDS.labels("follow_up").observe(time.perf_counter() - follow_up_started)
         else:
-            print("DEBUG: Gemini indicated data needed, but provided an empty question_list. Proceeding without asking questions.")
+            logger.debug("Gemini indicated data needed, but provided an empty question_list. Proceeding without asking questions.")
     else:
-        print("DEBUG: No further information required as per Gemini's assessment. Proceeding with available data.")
-
-    # Step 3: Final Prediction generate karo
-    print("DEBUG: Interaction complete (if any). Generating final prediction.")
-    
+        logger.debug("No further information required as per Gemini's assessment. Proceeding with available data.")
 
 
+async def llm_process(websocket: Any, mob: str, initial_question: str) -> str:
+    """
+    This function manages the entire interaction flow:
+    1. Determines if more data is needed using Gemini's check_for_additional_data.
+    2. Asks questions to the user if needed and collects responses.
+    3. Saves collected data into db_record['on_demand_data'].
+    4. Generates and returns a final prediction.
 
-    # My own logic for generating a prediction
-
-
-    user_dob = db_record['basic_data'].get('date_of_birth', 'Unknown').replace("/", "-")
-    user_planets_info = db_record.get('planets', {})
-    planet_based_retrieved_idx = get_matching_rules_by_planet_age_time(user_dob, user_planets_info)
+    Args:
+        websocket: The WebSocket connection for communication.
+        mob (str): User identifier.
+        initial_question (str): The user's initial query.
 
-    question_simillarity_based_retrieved_idx = get_relevant_excel_indices(initial_question)
+    Returns:
+        str: The final astrological prediction text.
+    """
+    logger.debug("Entering LLM Process for %s.", mob)
+    turn_started = time.perf_counter()
+    user_session = user_data_store[mob]
+    db_record = user_session["db_record"]
+    session_state = user_session["session_state"]
 
-    print(f"\n\nDEBUG: Retrieved indices based on planet age and time: {planet_based_retrieved_idx}")
-    print(f"\n\nDEBUG: Retrieved indices based on question similarity: {question_simillarity_based_retrieved_idx}")
+    # Retrieval sirf birth chart aur original question par depend karta hai, follow-up answers par nahi.
+    # Isliye yeh turant background mein shuru hota hai aur assessment + follow-up Q&A ke saath chalta hai;
+    # user ke aakhri jawaab ke baad sirf prediction call ka wait bachta hai.
+    retrieval_task = asyncio.create_task(retrieve_prompt_rules(user_session, initial_question))
+    try:
+        # Step 1: Check if more data is needed from the user using Gemini
+        logger.debug("Checking for additional data needs with Gemini.")
 
+        # --- CRITICAL FIX: AWAITING THE ASYNC LLM CALL ---
+        # The check_for_additional_data function must be an 'async def' function,
+        # and its internal call to model.generate_content() must be 'await'.
+        data_assessment = await timed_stage("assessment", check_for_additional_data(db_record, initial_question))
 
-    # Combine both sets of indices, ensuring uniqueness
+        # Step 2: Ask questions and collect responses (Interaction Loop)
+        await ask_follow_up_questions(websocket, mob, data_assessment)
 
-    combined_retrieved_indices = set(planet_based_retrieved_idx + question_simillarity_based_retrieved_idx)
-    print(f"\n\nDEBUG: Combined unique indices for final prediction: {combined_retrieved_indices}")
+        # Step 3: Final Prediction generate karo
+        logger.debug("Interaction complete (if any). Generating final prediction.")
 
-    final_retrieved_rules = get_llm_formatted_rules_string(list(combined_retrieved_indices))
+        # retrieval_wait: follow-up ke baad retrieval ka kitna hissa abhi bhi baaki tha.
+        with stage_timer("retrieval_wait"):
+            assembled_rules = await retrieval_task
+    except BaseException:
+        # Socket band ho gaya ya turn fail hua: background retrieval ko bhi rok do.
+        retrieval_task.cancel()
+        raise
+    final_retrieved_rules = assembled_rules.text
 
     try:
         IST = pytz.timezone('Asia/Kolkata')
@@ -187,27 +309,57 @@ async def llm_process(websocket: Any, mob: str, initial_question: str) -> str:
 
     current_time = datetime.now(IST)
 
-    prediction = predict_user_query(
-            db_record,
-            current_time,
-            final_retrieved_rules,
-            initial_question
-        )
+    prediction_started = time.perf_counter()
+    if STREAM_PREDICTIONS:
+        # Har partial chunk turant client ko bhejo; final text neeche save hota hai
+        # aur caller usse 'llm_response' message mein bhejta hai.
+        prediction_parts = []
+        try:
+            async for chunk in predict_user_query_stream(
+                    db_record,
+                    current_time,
+                    final_retrieved_rules,
+                    initial_question
+                ):
+                prediction_parts.append(chunk)
+                await websocket.send_json({"type": "llm_response_chunk", "message": chunk})
+            prediction = "".join(prediction_parts).strip()
+        except PredictionStreamInterrupted:
+            # Aadhi bani prediction poori nahi hai: final 'llm_response' streamed bubble ko
+            # error message se badal deta hai, aur adhoora text save nahi hota (neeche dekho).
+            prediction = ERROR_MESSAGE
+    else:
+        prediction = await predict_user_query(
+                db_record,
+                current_time,
+                final_retrieved_rules,
+                initial_question
+            )
+
+    STAGE_SECONDS.labels("prediction").observe(time.perf_counter() - prediction_started)
 
     # My own logic for generating a prediction ends
 
-    print(f"DEBUG: Final prediction generated: {prediction}")
-    
+    logger.debug("Final prediction generated: %s", prediction)
+
+    TURN_SECONDS.observe(time.perf_counter() - turn_started)
+    if prediction == ERROR_MESSAGE:
+        # Gemini fail hua: user ko error message jaata hai, par woh prediction history mein save nahi hota.
+        logger.warning("Prediction failed; not saving it to the user's predictions.")
+        return prediction
+
     prediction_record = {
         "user_question": initial_question,
         "astrology_prediction": prediction,
-        "time": datetime.now(IST).isoformat() 
+        "time": datetime.now(IST).isoformat(),
+        # Kis knowledge bank version ke rules se yeh prediction bani (turn shuru hote waqt pinned).
+        "kb_version": get_knowledge_bank().version,
     }
     
     db_record['predictions'] = [prediction_record] + db_record.get('predictions', [])
     save_database(mob)
-    
-    print(f"DEBUG: LLM Process complete. Returning final prediction.")
+
+    logger.debug("LLM Process complete. Returning final prediction.")
     # Step 4: Final Prediction Text return karo
     return prediction
 
@@ -218,16 +370,12 @@ async def llm_process(websocket: Any, mob: str, initial_question: str) -> str:
 async def handle_new_connection(websocket: WebSocket, mob: str):
     # (Yeh function waisa hi hai, bas thoda saaf kiya gaya hai)
     await websocket.accept()
-    print(f"INFO: WebSocket connected for MOB: {mob}")
+    logger.info("WebSocket connected for MOB: %s", mob)
 
-    if mob not in user_data_store:
-        user_data_store[mob] = {
-            "db_record": {"basic_data": {}, "on_demand_data": {}, "predictions": []},
-            "session_state": { "details_request_pending": False, "pending_question": None,
+    # Profile shared store se aata hai; cache mein ho to bhi version check hota hai,
+    # kyunki pichhla connection kisi doosre worker par ho sakta hai.
+    await user_data_store.refresh(mob)
 
-            }
-        }
-    
     db_record = user_data_store[mob]["db_record"]
     if not all(db_record['basic_data'].get(f) for f in ["name", "date_of_birth", "time_of_birth", "place_of_birth"]):
         user_data_store[mob]['session_state']['details_request_pending'] = True
@@ -242,6 +390,8 @@ async def handle_new_connection(websocket: WebSocket, mob: str):
         })
     else:
         user_data_store[mob]['session_state']['details_request_pending'] = False
+        # User ke pehle sawaal se pehle hi aaj ke chart rules background mein tayaar kar lo.
+        schedule_chart_precompute(user_data_store[mob])
         await websocket.send_json({"type": "status_update", "status": "ready_for_chat", "message": f"Welcome back, {db_record['basic_data'].get('name', 'friend')}!"})
 
 @app.websocket("/ws")
@@ -251,7 +401,17 @@ async def websocket_endpoint(websocket: WebSocket, mob: str):
     Core logic 'llm_process' ke andar hai.
     """
     # STAGE 1: Connection ko handle karo aur user ko pehchano.
-    await handle_new_connection(websocket, mob)
+    # Is connection (aur iske background tasks) ke saare log records is session se tag hote hain.
+    current_session.set(mob)
+    # Connection khula rahne tak session pinned rahta hai, taaki memory budget ke chakkar mein evict na ho.
+    user_data_store.pin(mob)
+    ACTIVE_WEBSOCKETS.inc()
+    try:
+        await handle_new_connection(websocket, mob)
+    except BaseException:
+        await user_data_store.release(mob)
+        ACTIVE_WEBSOCKETS.dec()
+        raise
 
     try:
         # STAGE 2: Ab client se aane wale messages ko suno aur sahi jagah bhejo.
@@ -259,19 +419,23 @@ async def websocket_endpoint(websocket: WebSocket, mob: str):
             data = await websocket.receive_text()
             message = json.loads(data)
             msg_type = message.get("type")
-            
-            user_session = user_data_store[mob]
+
+            # Har message se pehle check karo ki kisi doosre worker (doosre tab) ne profile to nahi badla.
+            user_session = await user_data_store.refresh(mob)
 
             if msg_type == "chat_message":
                 # Check karo ki kahin user details pending to nahi hain
                 if user_session['session_state'].get('details_request_pending'):
                     # Sawaal ko save karke rakho aur user ko details bharne do
                     user_session['session_state']['pending_question'] = message.get("user_question")
-                    print("DEBUG: Details pending. Storing question for later.")
+                    save_database(mob)
+                    logger.debug("Details pending. Storing question for later.")
                     continue
                 
-                # Agar sab theek hai, to core logic 'llm_process' ko call karo
-                final_prediction = await llm_process(websocket, mob, message.get("user_question"))
+                # Agar sab theek hai, to core logic 'llm_process' ko call karo.
+                # Poora turn ek hi knowledge bank version par chalta hai, beech mein reload ho jaye tab bhi.
+                with pinned_knowledge_bank():
+                    final_prediction = await llm_process(websocket, mob, message.get("user_question"))
                 
                 # 'llm_process' se mili prediction ko user ko bhejo
                 await websocket.send_json({"type": "llm_response", "message": final_prediction, "display_message_in_chat": True})
@@ -288,6 +452,8 @@ async def websocket_endpoint(websocket: WebSocket, mob: str):
                 db_record['longitude'] = round(random.uniform(-180, 180), 4)
                 db_record['planets'] = {planet: random.randint(1, 12) for planet in PLANETS}
                 save_database(mob)
+                # Nayi details ke liye chart matching abhi se shuru karo (purana kaam cancel ho jaata hai).
+                schedule_chart_precompute(user_session)
                 
                 user_session['session_state']['details_request_pending'] = False
                 await websocket.send_json({"type": "status_update", "status": "details_saved", "message": "Thank you! Your details are saved."})
@@ -295,20 +461,25 @@ async def websocket_endpoint(websocket: WebSocket, mob: str):
                 # Check karo ki kya koi sawaal pending tha
                 pending_question = user_session['session_state'].get('pending_question')
                 if pending_question:
-                    print("DEBUG: Details saved. Processing pending question now.")
+                    logger.debug("Details saved. Processing pending question now.")
+                    user_session['session_state']['pending_question'] = None
                     # Agar sawaal pending tha, to ab 'llm_process' ko call karo
-                    final_prediction = await llm_process(websocket, mob, pending_question)
+                    with pinned_knowledge_bank():
+                        final_prediction = await llm_process(websocket, mob, pending_question)
                     await websocket.send_json({"type": "llm_response", "message": final_prediction, "display_message_in_chat": True})
             
             elif msg_type == "submit_custom_input":
                 # Is message ko ab 'get_next_user_response' function handle karta hai,
                 # isliye yahaan par isko ignore karna safe hai.
-                print("DEBUG: 'submit_custom_input' received by main loop, but handled by 'llm_process'. Ignoring.")
+                logger.debug("'submit_custom_input' received by main loop, but handled by 'llm_process'. Ignoring.")
                 pass
 
     except WebSocketDisconnect:
-        print(f"INFO: WebSocket disconnected for MOB: {mob}")
+        logger.info("WebSocket disconnected for MOB: %s", mob)
     except Exception as e:
-        print(f"ERROR: An unexpected error occurred for {mob}: {e}")
+        logger.exception("An unexpected error occurred for %s: %s", mob, e)
         if not websocket.client_state == 'DISCONNECTED':
-            await websocket.send_json({"type": "error", "message": f"Server error: {e}"})
\ No newline at end of file
+            await websocket.send_json({"type": "error", "message": f"Server error: {e}"})
+    finally:
+        await user_data_store.release(mob)
+        ACTIVE_WEBSOCKETS.dec()
\ No newline at end of file
@@ -0,0 +1,290 @@
+"""
+Bulk offline predictions, e.g. for the nightly horoscope run.
+
+Reads a CSV or JSONL file with one (mob, birth details, question) row per
+line and writes one JSON line per row to the output file:
+
+    python batch_predict.py users.jsonl predictions.jsonl --workers 8 --concurrency 32
+
+Input columns / keys:
+    mob, question                                        (required)
+    name, date_of_birth, time_of_birth, place_of_birth   (DOB as YYYY/MM/DD or YYYY-MM-DD)
+    planets                                              dict (JSONL) or JSON string (CSV),
+                                                         or one column per planet (Sun, Moon, ...)
+
+Missing birth details or planets are filled from the user's stored record
+in the user database (USER_DB_FILE), so the batch uses the same chart as
+the chat.
+
+Rule matching and formatting run in a process pool (each worker maps the
+compiled knowledge bank artifact); Gemini calls run through a bounded async pool. Results are written
+as they complete, so the output file is also the checkpoint: re-running with
+the same output file skips every row already written with status "ok" or
+"invalid" and retries rows that failed. A row that cannot be parsed or
+lacks required data is written as "invalid", and any other failure as
+"error"; neither stops the rest of the batch.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterator, NamedTuple, Optional, Set, Tuple, Union
+import pytz
+from knowledge_bank import EXCEL_FILE, KnowledgeBank, get_knowledge_bank, load_knowledge_bank
+from logging_setup import configure_logging
+from prediction_of_user_query import ERROR_MESSAGE, predict_user_query
+from prompt_assembler import assemble_prompt_rules
+from retrieve_index_on_birth_chart import DEFAULT_TOP_K_RULES, PLANET_NAME_MAP, rank_matching_rules_by_planet_age_time
+from user_database import DATABASE_FILE, UserDatabase
+
+IST = pytz.timezone('Asia/Kolkata')
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "16"))
+
+BASIC_FIELDS = ("name", "date_of_birth", "time_of_birth", "place_of_birth")
+
+# Statuses that are final; anything else is retried on the next run.
+DONE_STATUSES = {"ok", "invalid"}
+
+
+def _init_worker(excel_file: str):
+    load_knowledge_bank(excel_file)
+
+
+def match_and_format_rules(user_dob: str, planets: Dict[str, int], user_question: str) -> Tuple[list, str, str, int]:
+    """
+    Process-pool task: chart-matches one user and assembles the prompt rules
+    (deduplicated, ranked against the question, within the token budget).
+
+    Returns:
+        tuple: (included Excel row numbers, LLM-formatted rules text,
+                knowledge bank version, number of matched rules dropped)
+    """
+    ranked_rules = rank_matching_rules_by_planet_age_time(user_dob, planets)[:DEFAULT_TOP_K_RULES]
+    assembled_rules = assemble_prompt_rules(user_question, ranked_rules)
+    return assembled_rules.indices, assembled_rules.text, get_knowledge_bank().version, assembled_rules.dropped
+
+
+class InvalidLine(NamedTuple):
+    """Stands in for an input line that could not be parsed; the row is recorded as invalid."""
+    error: str
+
+
+def read_input_rows(path: str) -> Iterator[Tuple[int, Union[Dict[str, Any], Any]]]:
+    """
+    Yields (row_id, row) from a CSV or JSONL file; row_id is the 1-based data row.
+
+    A JSONL line that is not valid JSON is yielded as an `InvalidLine`, so one
+    bad line does not stop the batch.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            for row_id, row in enumerate(csv.DictReader(f), start=1):
+                yield row_id, row
+        else:
+            row_id = 0
+            for line in f:
+                if line.strip():
+                    row_id += 1
+                    try:
+                        yield row_id, json.loads(line)
+                    except json.JSONDecodeError as e:
+                        logger.warning("Input line for row %d is not valid JSON: %s", row_id, e)
+                        yield row_id, InvalidLine(f"malformed JSON: {e}")
+
+
+def read_checkpoint(path: str) -> Set[int]:
+    """Returns the row_ids already finished in an existing output file."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by an interrupted run; that row is simply redone.
+                continue
+            if record.get("status") in DONE_STATUSES:
+                done.add(record["row_id"])
+    return done
+
+
+def _row_planets(row: Dict[str, Any]) -> Optional[Dict[str, int]]:
+    planets = row.get("planets")
+    if isinstance(planets, str) and planets.strip():
+        planets = json.loads(planets)
+    if planets and not isinstance(planets, dict):
+        raise ValueError("planets must be an object of planet -> house")
+    if not planets:
+        planets = {name: row[name] for name in PLANET_NAME_MAP if row.get(name) not in (None, "")}
+    return {name: int(house) for name, house in planets.items()} if planets else None
+
+
+def build_db_record(row: Dict[str, Any], stored_record: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Builds the `db_record` used for the prediction: the stored profile (if
+    any), overridden by whatever the input row provides.
+
+    Raises:
+        ValueError: If no date of birth or planet positions are available.
+    """
+    db_record = json.loads(json.dumps(stored_record)) if stored_record else {}
+    db_record.setdefault("basic_data", {})
+    db_record.setdefault("on_demand_data", {})
+    for field in BASIC_FIELDS:
+        if row.get(field):
+            db_record["basic_data"][field] = str(row[field])
+    planets = _row_planets(row)
+    if planets:
+        db_record["planets"] = planets
+
+    if not db_record["basic_data"].get("date_of_birth"):
+        raise ValueError("no date_of_birth in row or stored profile")
+    if not db_record.get("planets"):
+        raise ValueError("no planet positions in row or stored profile")
+    return db_record
+
+
+class BatchPredictor:
+    """Runs the retrieval + prediction pipeline for every pending input row."""
+
+    def __init__(self, pool: ProcessPoolExecutor, concurrency: int, output, user_db: Optional[UserDatabase]):
+        self.pool = pool
+        self.llm_slots = asyncio.Semaphore(concurrency)
+        # Bounds how many rows are in flight at once, so huge inputs are streamed, not loaded.
+        self.row_slots = asyncio.Semaphore(concurrency * 4)
+        self.output = output
+        self.user_db = user_db
+        self.counts = {"ok": 0, "invalid": 0, "error": 0}
+
+    def write_result(self, record: Dict[str, Any]):
+        self.output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.output.flush()
+        self.counts[record["status"]] += 1
+
+    async def process_row(self, row_id: int, row: Any):
+        """Predicts one row, recording it as "invalid" or "error" instead of raising."""
+        if isinstance(row, InvalidLine) or not isinstance(row, dict):
+            error = row.error if isinstance(row, InvalidLine) else "row is not a JSON object"
+            self.write_result({"row_id": row_id, "status": "invalid", "error": error})
+            return
+        try:
+            await self._predict_row(row_id, row)
+        except Exception as e:
+            logger.exception("Row %d failed.", row_id)
+            self.write_result({
+                "row_id": row_id, "mob": str(row.get("mob", "")), "status": "error", "error": f"{type(e).__name__}: {e}",
+            })
+
+    async def _predict_row(self, row_id: int, row: Dict[str, Any]):
+        record = {"row_id": row_id, "mob": str(row.get("mob", "")), "user_question": row.get("question", "")}
+        try:
+            stored_record = await self.user_db.load(record["mob"]) if self.user_db else None
+            db_record = build_db_record(row, stored_record)
+            if not record["user_question"]:
+                raise ValueError("no question")
+        except (ValueError, TypeError) as e:
+            self.write_result({**record, "status": "invalid", "error": str(e)})
+            return
+
+        loop = asyncio.get_running_loop()
+        user_dob = db_record["basic_data"]["date_of_birth"].replace("/", "-")
+        try:
+            indices, rules_text, kb_version, rules_dropped = await loop.run_in_executor(
+                self.pool, match_and_format_rules, user_dob, db_record["planets"], record["user_question"]
+            )
+        except Exception as e:
+            self.write_result({**record, "status": "error", "error": f"rule matching failed: {e}"})
+            return
+
+        async with self.llm_slots:
+            prediction = await predict_user_query(db_record, datetime.now(IST), rules_text, record["user_question"])
+
+        status = "error" if prediction == ERROR_MESSAGE else "ok"
+        self.write_result({
+            **record,
+            "status": status,
+            "astrology_prediction": prediction,
+            "matched_rules": indices,
+            "rules_dropped": rules_dropped,
+            "kb_version": kb_version,
+            "time": datetime.now(IST).isoformat(),
+        })
+
+    async def _run_row(self, row_id: int, row: Any):
+        try:
+            await self.process_row(row_id, row)
+        except Exception:
+            # Only reached if the result itself could not be written; the row is redone on the next run.
+            logger.exception("Could not record row %d.", row_id)
+        finally:
+            self.row_slots.release()
+
+    async def run(self, rows: Iterator[Tuple[int, Any]]):
+        tasks = set()
+        for row_id, row in rows:
+            await self.row_slots.acquire()
+            task = asyncio.create_task(self._run_row(row_id, row))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def run_batch(input_path: str, output_path: str, workers: int, concurrency: int,
+                    excel_file: str = EXCEL_FILE, user_db_file: Optional[str] = DATABASE_FILE) -> Dict[str, int]:
+    """
+    Predicts every row of `input_path` not yet finished in `output_path`.
+
+    Returns:
+        dict: Number of rows written per status in this run.
+    """
+    done = read_checkpoint(output_path)
+    pending = ((row_id, row) for row_id, row in read_input_rows(input_path) if row_id not in done)
+    if done:
+        logger.info("Resuming; %d rows already finished in '%s'.", len(done), output_path)
+
+    # Compiles the knowledge bank artifact once up front (a no-op when it is current),
+    # so the workers memory-map it instead of each parsing the sheet.
+    KnowledgeBank(excel_file).load()
+
+    user_db = None
+    if user_db_file and os.path.exists(user_db_file):
+        user_db = UserDatabase(user_db_file)
+        await user_db.open()
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(excel_file,)) as pool, \
+                open(output_path, "a", encoding="utf-8") as output:
+            predictor = BatchPredictor(pool, concurrency, output, user_db)
+            await predictor.run(pending)
+    finally:
+        if user_db is not None:
+            await user_db.close()
+    return predictor.counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run astrology predictions for a CSV/JSONL file of users.")
+    parser.add_argument("input", help="CSV or JSONL file of (mob, birth details, question) rows")
+    parser.add_argument("output", help="JSONL results file; also the resume checkpoint")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="rule-matching processes (default: all cores)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="concurrent Gemini calls")
+    parser.add_argument("--excel-file", default=EXCEL_FILE)
+    parser.add_argument("--user-db", default=DATABASE_FILE, help="user database used to fill in missing profile fields")
+    args = parser.parse_args()
+
+    configure_logging()
+    counts = asyncio.run(run_batch(args.input, args.output, args.workers, args.concurrency, args.excel_file, args.user_db))
+    logger.info("Batch finished: %d ok, %d failed, %d invalid.", counts['ok'], counts['error'], counts['invalid'])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+WebSocket load generator for `/ws`.
+
+Opens N concurrent sessions against a running server and replays the UI
+flow for each: connect, `save_user_details` (for new users), then a number
+of `chat_message` turns, answering every `request_custom_data` with a
+`submit_custom_input`. Reports turn latency percentiles (question sent ->
+final `llm_response`), time to the first streamed chunk, and throughput, as JSON.
+
+Start the server with the offline fake Gemini so no API quota is used:
+
+    FAKE_GEMINI=1 FAKE_GEMINI_LATENCY=lognormal:0.8,0.4 uvicorn app:app
+    python -m benchmarks.load_test --url ws://localhost:8000/ws --sessions 100 --turns 3
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from typing import Dict, List, Optional
+import websockets
+from benchmarks.synthetic_knowledge_bank import generate_sample_queries
+
+DEFAULT_URL = "ws://localhost:8000/ws"
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """p50 / p95 / p99 / max in milliseconds (None when there are no samples)."""
+    if not values:
+        return {"count": 0, "p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    ordered = sorted(values)
+
+    def at(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000
+
+    return {"count": len(ordered), "p50_ms": at(0.50), "p95_ms": at(0.95), "p99_ms": at(0.99), "max_ms": ordered[-1] * 1000}
+
+
+class LoadStats:
+    def __init__(self):
+        self.turn_latencies: List[float] = []
+        self.first_chunk_latencies: List[float] = []
+        self.setup_latencies: List[float] = []
+        self.follow_up_questions = 0
+        self.server_errors = 0
+        self.failed_sessions = 0
+        self.failures: Dict[str, int] = {}
+
+    def record_failure(self, error: Exception):
+        self.failed_sessions += 1
+        key = type(error).__name__
+        self.failures[key] = self.failures.get(key, 0) + 1
+
+
+async def _receive(ws, timeout: float) -> dict:
+    return json.loads(await asyncio.wait_for(ws.recv(), timeout))
+
+
+async def run_session(url: str, mob: str, questions: List[str], stats: LoadStats, timeout: float, think_time: float):
+    """Drives one user through setup and `len(questions)` chat turns."""
+    start = time.perf_counter()
+    async with websockets.connect(f"{url}?mob={mob}", max_size=None) as ws:
+        message = await _receive(ws, timeout)
+        if message.get("status") == "user_details_needed":
+            await ws.send(json.dumps({
+                "type": "save_user_details", "mob": mob, "name": f"Load {mob}", "date_of_birth": "1990/05/15",
+                "time_of_birth": "10:12", "place_of_birth": "Delhi",
+            }))
+            while message.get("status") != "details_saved":
+                message = await _receive(ws, timeout)
+        stats.setup_latencies.append(time.perf_counter() - start)
+
+        for question in questions:
+            turn_start = time.perf_counter()
+            first_chunk_at = None
+            await ws.send(json.dumps({"type": "chat_message", "mob": mob, "user_question": question}))
+            while True:
+                message = await _receive(ws, timeout)
+                msg_type = message.get("type")
+                if msg_type == "request_custom_data":
+                    stats.follow_up_questions += 1
+                    await ws.send(json.dumps({
+                        "type": "submit_custom_input", "mob": mob,
+                        "custom_data": {field["id"]: field.get("example") or "not sure" for field in message["action_needed_fields"]},
+                    }))
+                elif msg_type == "llm_response_chunk":
+                    if first_chunk_at is None:
+                        first_chunk_at = time.perf_counter()
+                elif msg_type == "llm_response":
+                    break
+                elif msg_type == "error":
+                    stats.server_errors += 1
+                    break
+            turn_end = time.perf_counter()
+            stats.turn_latencies.append(turn_end - turn_start)
+            if first_chunk_at is not None:
+                stats.first_chunk_latencies.append(first_chunk_at - turn_start)
+            if think_time:
+                await asyncio.sleep(think_time)
+
+
+async def run_load(url: str, sessions: int, turns: int, ramp_seconds: float, timeout: float,
+                   think_time: float, seed: int) -> dict:
+    stats = LoadStats()
+    queries = generate_sample_queries(sessions * turns, seed)
+    # Unique per run, so every session starts as a new user.
+    run_id = f"{int(time.time())}{random.Random(seed).randint(100, 999)}"
+
+    async def session(i: int):
+        if ramp_seconds:
+            await asyncio.sleep(ramp_seconds * i / sessions)
+        try:
+            await run_session(url, f"load{run_id}{i:05d}", queries[i * turns:(i + 1) * turns], stats, timeout, think_time)
+        except Exception as e:
+            stats.record_failure(e)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(session(i) for i in range(sessions)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "url": url,
+        "sessions": sessions,
+        "turns_per_session": turns,
+        "elapsed_seconds": elapsed,
+        "completed_turns": len(stats.turn_latencies),
+        "throughput_turns_per_second": len(stats.turn_latencies) / elapsed if elapsed else None,
+        "turn_latency": percentiles(stats.turn_latencies),
+        "first_chunk_latency": percentiles(stats.first_chunk_latencies),
+        "session_setup_latency": percentiles(stats.setup_latencies),
+        "follow_up_questions": stats.follow_up_questions,
+        "server_errors": stats.server_errors,
+        "failed_sessions": stats.failed_sessions,
+        "failures": stats.failures,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the /ws chat endpoint with concurrent sessions.")
+    parser.add_argument("--url", default=DEFAULT_URL)
+    parser.add_argument("--sessions", type=int, default=50, help="concurrent WebSocket sessions")
+    parser.add_argument("--turns", type=int, default=3, help="chat turns per session")
+    parser.add_argument("--ramp-seconds", type=float, default=0.0, help="spread session starts over this long")
+    parser.add_argument("--think-time", type=float, default=0.0, help="pause between a session's turns (seconds)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="max wait for any single server message")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load(args.url, args.sessions, args.turns, args.ramp_seconds, args.timeout,
+                                  args.think_time, args.seed))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Benchmarks the retrieval path against synthetic knowledge banks.
+
+For every size it builds a synthetic knowledge bank (see
+synthetic_knowledge_bank.py), installs it as the shared instance, and times:
+
+    load               compiling predicates and building the indexes
+    artifact_write     writing the compiled artifact (kb_artifact.py)
+    artifact_load      memory-mapping it back; every later stage runs on
+                       the mapped knowledge bank, as the app's workers do
+    render_all         pre-rendering every rule's Condition/Result block
+    chart_matching     get_matching_rules_by_planet_age_time (all planets)
+    similarity_search  the local Result similarity index
+    rule_formatting    assemble_prompt_rules (dedupe, rank, pack within the
+                       token budget) for the retrieved rows
+    prompt_assembly    build_prediction_prompt
+    prediction         predict_user_query against the deterministic fake Gemini
+
+Run from the repository root; results are written as JSON so runs from
+different commits can be compared:
+
+    python -m benchmarks.run_benchmarks --sizes 1000 10000 100000 --output benchmark_results.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import os
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List
+from benchmarks.synthetic_knowledge_bank import generate_rows, generate_sample_queries
+from fake_gemini import install_fake_gemini
+from kb_artifact import read_artifact, write_artifact
+from knowledge_bank import IST, KnowledgeBank, set_knowledge_bank
+from prediction_of_user_query import build_prediction_prompt, predict_user_query
+from prompt_assembler import assemble_prompt_rules
+from retrieve_astro_chart import get_rendered_rules, render_rule_blocks
+from retrieve_index_of_similar_question import DEFAULT_TOP_K, MIN_SIMILARITY_SCORE
+from retrieve_index_on_birth_chart import (
+    DEFAULT_TOP_K_RULES, PLANET_NAME_MAP, get_matching_rules_by_planet_age_time, rank_matching_rules_by_planet_age_time,
+)
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_ITERATIONS = 200
+
+
+def summarize(durations: List[float]) -> Dict[str, float]:
+    """Reduces per-iteration durations (seconds) to millisecond statistics."""
+    ordered = sorted(durations)
+    return {
+        "iterations": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def time_calls(func: Callable, arguments: List[tuple]) -> Dict[str, float]:
+    durations = []
+    for args in arguments:
+        start = time.perf_counter()
+        func(*args)
+        durations.append(time.perf_counter() - start)
+    return summarize(durations)
+
+
+async def _time_predictions(arguments: List[tuple]) -> Dict[str, float]:
+    durations = []
+    for args in arguments:
+        start = time.perf_counter()
+        await predict_user_query(*args)
+        durations.append(time.perf_counter() - start)
+    return summarize(durations)
+
+
+def _sample_users(count: int, seed: int) -> List[dict]:
+    rng = random.Random(seed)
+    full_names = list(PLANET_NAME_MAP)
+    users = []
+    for i in range(count):
+        dob = f"{rng.randint(1950, 2010)}/{rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}"
+        users.append({
+            "basic_data": {"name": f"User {i}", "date_of_birth": dob, "time_of_birth": "10:00", "place_of_birth": "Delhi"},
+            "on_demand_data": {},
+            "planets": {name: rng.randint(1, 12) for name in full_names},
+        })
+    return users
+
+
+def benchmark_size(row_count: int, iterations: int, seed: int) -> Dict[str, object]:
+    """Runs every benchmark against one synthetic knowledge bank."""
+    rows = generate_rows(row_count, seed)
+
+    start = time.perf_counter()
+    knowledge_bank = KnowledgeBank(excel_file=f"<synthetic {row_count}>", artifact_file="").load_rows(rows)
+    load_seconds = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        artifact_path = os.path.join(temp_dir, "synthetic.kbc")
+        start = time.perf_counter()
+        write_artifact(artifact_path, knowledge_bank, "synthetic")
+        artifact_write_seconds = time.perf_counter() - start
+        artifact_bytes = os.path.getsize(artifact_path)
+
+        # The mapping stays valid after the file is unlinked.
+        start = time.perf_counter()
+        knowledge_bank = KnowledgeBank(excel_file=f"<synthetic {row_count}>").load_artifact(
+            read_artifact(artifact_path, "synthetic")
+        )
+        artifact_load_seconds = time.perf_counter() - start
+    set_knowledge_bank(knowledge_bank)
+
+    start = time.perf_counter()
+    render_rule_blocks(knowledge_bank)
+    render_seconds = time.perf_counter() - start
+    get_rendered_rules()
+
+    users = _sample_users(iterations, seed)
+    queries = generate_sample_queries(iterations, seed)
+    dobs = [user["basic_data"]["date_of_birth"].replace("/", "-") for user in users]
+
+    # Warm-up: the per-day active-rule set is built once and cached.
+    get_matching_rules_by_planet_age_time(dobs[0], users[0]["planets"], all_planets=True)
+
+    chart_scores = [
+        rank_matching_rules_by_planet_age_time(dob, user["planets"])[:DEFAULT_TOP_K_RULES]
+        for dob, user in zip(dobs, users)
+    ]
+    similar_indices = [
+        [idx for idx, _ in knowledge_bank.similarity_index.search(query, DEFAULT_TOP_K, MIN_SIMILARITY_SCORE)]
+        for query in queries
+    ]
+    assembly_arguments = list(zip(queries, chart_scores, similar_indices))
+    assembled = [assemble_prompt_rules(*arguments) for arguments in assembly_arguments]
+    rules_texts = [rules.text for rules in assembled]
+    now = datetime.now(IST)
+
+    results = {
+        "rows": row_count,
+        "compiled_rules": len(knowledge_bank.compiled),
+        "unique_results": knowledge_bank.similarity_index.doc_count,
+        "load_seconds": load_seconds,
+        "artifact_write_seconds": artifact_write_seconds,
+        "artifact_load_seconds": artifact_load_seconds,
+        "artifact_bytes": artifact_bytes,
+        "render_all_seconds": render_seconds,
+        "mean_candidate_rules": statistics.fmean(
+            len(set(idx for idx, _ in scores) | set(indices)) for scores, indices in zip(chart_scores, similar_indices)
+        ),
+        "mean_rules_per_prompt": statistics.fmean(len(rules.indices) for rules in assembled),
+        "mean_rules_dropped": statistics.fmean(rules.dropped for rules in assembled),
+        "chart_matching": time_calls(
+            get_matching_rules_by_planet_age_time,
+            [(dob, user["planets"], True) for dob, user in zip(dobs, users)],
+        ),
+        "similarity_search": time_calls(
+            knowledge_bank.similarity_index.search,
+            [(query, DEFAULT_TOP_K, MIN_SIMILARITY_SCORE) for query in queries],
+        ),
+        "rule_formatting": time_calls(assemble_prompt_rules, assembly_arguments),
+        "prompt_assembly": time_calls(
+            build_prediction_prompt,
+            [(user, now, text, query) for user, text, query in zip(users, rules_texts, queries)],
+        ),
+        "prediction": asyncio.run(_time_predictions(
+            [(user, now, text, query) for user, text, query in zip(users, rules_texts, queries)]
+        )),
+    }
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retrieval and prompt building on synthetic knowledge banks.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="knowledge bank sizes (rows)")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS, help="timed calls per benchmark")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON results file ('-' for stdout only)")
+    args = parser.parse_args()
+
+    install_fake_gemini()
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(IST).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "iterations": args.iterations,
+        "seed": args.seed,
+        "results": [benchmark_size(size, args.iterations, args.seed) for size in args.sizes],
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output != "-":
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
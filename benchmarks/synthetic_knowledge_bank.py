@@ -0,0 +1,120 @@
+"""
+Synthetic knowledge banks in the real 'Condition' grammar, for benchmarks.
+
+Rows mix the shapes found in the Excel sheet: a planet in one house with a
+periodic TIME clause (the bulk of the sheet, some of them truncated the way
+long cells are), multi-house rules with `conjunct` / `not-with` and an
+AGE clause, and two-planet rules with an AGE clause. Generation is seeded,
+so a given (rows, seed) always produces the same knowledge bank.
+
+    python -m benchmarks.synthetic_knowledge_bank 10000 synthetic_10k.xlsx
+"""
+import argparse
+import random
+from datetime import date, timedelta
+from typing import Dict, List
+from knowledge_bank import FIRST_EXCEL_ROW
+
+PLANETS = ["Sun", "Moon", "Mars", "Mer", "Jup", "Ven", "Sat", "Rahu", "Ketu"]
+ALL_HOUSES = "/".join(str(h) for h in range(1, 13))
+
+# Result texts are combined from these, giving a few hundred distinct Results
+# (the real sheet repeats a small set of texts across many rows).
+_SUBJECTS = [
+    "आर्थिक स्थिति", "व्यापार", "नौकरी", "स्वास्थ्य", "परिवार", "संतान", "विवाह", "प्रेम संबंध",
+    "मित्रों के साथ संबंध", "यात्रा", "निवेश", "घर", "कार्य क्षेत्र", "शिक्षा", "मान सम्मान",
+    "भाई बहन", "जीवनसाथी", "कानूनी मामले", "नया कार्य", "माता पिता",
+]
+_OUTCOMES = [
+    "में लाभ होगा।", "में सावधानी रखें।", "में बदलाव के योग हैं।", "में विवाद हो सकता है।",
+    "में नए अवसर मिलेंगे।", "में धोखा होने की संभावना है।", "में सुधार आएगा।", "में रुकावट आ सकती है।",
+    "से सुख मिलेगा।", "के लिए समय अनुकूल है।", "पर खर्च बढ़ेगा।", "में निर्णय सोच समझकर लें।",
+    "में स्थिरता आएगी।", "में तनाव रह सकता है।", "में सफलता मिलेगी।", "में देरी हो सकती है।",
+]
+
+
+def _time_clause(rng: random.Random, truncate: bool) -> str:
+    period_days = rng.randint(12 * 365, 30 * 365)
+    duration_days = rng.randint(180, 900)
+    start = date(1930, 1, 1) + timedelta(days=rng.randint(0, period_days))
+    windows = []
+    while start.year < 2050:
+        end = start + timedelta(days=duration_days)
+        windows.append(f"({start.isoformat()} to {end.isoformat()})")
+        start += timedelta(days=period_days)
+    clause = f"TIME ({', '.join(windows)})"
+    if truncate:
+        # Long cells are cut off mid-window in the sheet, e.g. "... (2014-06-18 to".
+        clause = clause[:clause.rindex(" to ") + 3]
+    return clause
+
+
+def _ages(rng: random.Random) -> str:
+    return "/".join(str(a) for a in sorted(rng.sample(range(5, 80), rng.randint(1, 5))))
+
+
+def generate_condition(rng: random.Random) -> str:
+    """Draws one Condition string."""
+    shape = rng.random()
+    planet, other, third = rng.sample(PLANETS, 3)
+    if shape < 0.70:
+        return f"Natal ({planet} in {rng.randint(1, 12)}) AND {_time_clause(rng, truncate=False)}"
+    if shape < 0.75:
+        return f"Natal ({planet} in {rng.randint(1, 12)}) AND {_time_clause(rng, truncate=True)}"
+    if shape < 0.90:
+        return (
+            f"Natal ({planet} in {ALL_HOUSES} and {planet} conjunct {other} and {planet} not-with {third}) "
+            f"and age ({_ages(rng)})"
+        )
+    return f"Natal ({planet} in {rng.randint(1, 12)} and {other} in {rng.randint(1, 12)}) and age ({_ages(rng)})"
+
+
+def generate_result(rng: random.Random) -> str:
+    return f"{rng.choice(_SUBJECTS)} {rng.choice(_OUTCOMES)}"
+
+
+def generate_rows(row_count: int, seed: int = 0) -> Dict[int, Dict[str, str]]:
+    """
+    Returns `row_count` synthetic rules keyed by Excel row number, in the
+    format `KnowledgeBank.load_rows` expects.
+    """
+    rng = random.Random(seed)
+    return {
+        idx: {
+            "number": str(idx - FIRST_EXCEL_ROW + 1),
+            "condition": generate_condition(rng),
+            "result": generate_result(rng),
+        }
+        for idx in range(FIRST_EXCEL_ROW, FIRST_EXCEL_ROW + row_count)
+    }
+
+
+def generate_sample_queries(count: int, seed: int = 0) -> List[str]:
+    """Questions in the mix of scripts users type (English, Hinglish, Devanagari)."""
+    rng = random.Random(seed)
+    templates = [
+        "How will my {} be this year?", "Mera {} kaisa rahega?", "{} ke baare mein batao",
+        "Will I get success in {}?", "मेरा {} कैसा रहेगा?",
+    ]
+    topics = ["career", "health", "money", "business", "marriage", "love", "family", "travel", "naukri", "sehat"]
+    return [rng.choice(templates).format(rng.choice(topics)) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic knowledge bank to an Excel file.")
+    parser.add_argument("rows", type=int)
+    parser.add_argument("output", help="path of the .xlsx file to write")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    rows = generate_rows(args.rows, args.seed)
+    pd.DataFrame(
+        [{"Number": row["number"], "Condition": row["condition"], "Result": row["result"]} for row in rows.values()]
+    ).to_excel(args.output, index=False)
+    print(f"INFO: Wrote {len(rows)} synthetic rules to '{args.output}'.")
+
+
+if __name__ == "__main__":
+    main()
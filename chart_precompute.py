@@ -0,0 +1,118 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+from knowledge_bank import get_knowledge_bank, pinned_knowledge_bank, today_in_ist
+from metrics import stage_timer
+from retrieve_astro_chart import get_rendered_rules
+from retrieve_index_on_birth_chart import DEFAULT_TOP_K_RULES, rank_matching_rules_by_planet_age_time
+
+logger = logging.getLogger(__name__)
+
+
+def chart_key(db_record: Dict[str, Any]) -> tuple:
+    """Identifies the inputs chart matching depends on (DOB + planet houses)."""
+    user_dob = db_record.get('basic_data', {}).get('date_of_birth', 'Unknown').replace("/", "-")
+    planets = tuple(sorted(db_record.get('planets', {}).items()))
+    return (user_dob, planets)
+
+
+async def compute_chart_rules(db_record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Runs birth-chart matching for today (IST) off the event loop, and makes
+    sure today's rule blocks are rendered for the prompt assembler.
+
+    Both steps run against one knowledge bank snapshot, recorded as "kb_version".
+
+    Returns:
+        dict: {"day": date, "key": chart_key, "kb_version": str,
+               "indices": [...], "scores": [(index, score), ...]}
+    """
+    key = chart_key(db_record)
+    day = today_in_ist()
+    user_dob, planets = key
+    with stage_timer("chart_precompute"), pinned_knowledge_bank() as knowledge_bank:
+        ranked_rules = await asyncio.to_thread(rank_matching_rules_by_planet_age_time, user_dob, dict(planets))
+        scores = ranked_rules[:DEFAULT_TOP_K_RULES]
+        await asyncio.to_thread(get_rendered_rules)
+    return {
+        "day": day,
+        "key": key,
+        "kb_version": knowledge_bank.version,
+        "indices": [idx for idx, _ in scores],
+        "scores": scores,
+    }
+
+
+def _is_current(chart_rules: Optional[Dict[str, Any]], db_record: Dict[str, Any]) -> bool:
+    return (
+        chart_rules is not None
+        and chart_rules["day"] == today_in_ist()
+        and chart_rules["key"] == chart_key(db_record)
+        and chart_rules["kb_version"] == get_knowledge_bank().version
+    )
+
+
+def schedule_chart_precompute(session: Dict[str, Any]):
+    """
+    Starts (or restarts) background chart matching for a session.
+
+    Called when birth details are saved and when a known user reconnects. Any
+    computation still running for older details is cancelled; the result is
+    attached to `session_state['chart_rules']` for the next chat turn.
+    """
+    db_record = session["db_record"]
+    session_state = session["session_state"]
+    if not db_record.get('planets'):
+        return
+
+    previous_task = session_state.get("chart_rules_task")
+    if previous_task is not None and not previous_task.done():
+        previous_task.cancel()
+
+    if _is_current(session_state.get("chart_rules"), db_record):
+        session_state["chart_rules_task"] = None
+        return
+
+    session_state["chart_rules"] = None
+    task = asyncio.create_task(compute_chart_rules(db_record))
+
+    def attach_result(finished_task: asyncio.Task):
+        if finished_task.cancelled() or finished_task.exception() is not None:
+            return
+        if session_state.get("chart_rules_task") is finished_task:
+            session_state["chart_rules"] = finished_task.result()
+
+    task.add_done_callback(attach_result)
+    session_state["chart_rules_task"] = task
+
+
+async def get_chart_rules(session: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Returns today's chart-matched rules for the session.
+
+    Uses the precomputed result when it is still valid (same details, same IST
+    day, same knowledge bank version as the turn), waits for an in-flight
+    precomputation of the current details, and only computes inline as a last
+    resort.
+    """
+    db_record = session["db_record"]
+    session_state = session["session_state"]
+
+    chart_rules = session_state.get("chart_rules")
+    if _is_current(chart_rules, db_record):
+        return chart_rules
+
+    task = session_state.get("chart_rules_task")
+    if task is not None and not task.cancelled():
+        try:
+            chart_rules = await asyncio.shield(task)
+        except Exception as e:
+            logger.warning("Chart precomputation failed: %s. Recomputing.", e)
+            chart_rules = None
+        if _is_current(chart_rules, db_record):
+            return chart_rules
+
+    chart_rules = await compute_chart_rules(db_record)
+    session_state["chart_rules"] = chart_rules
+    session_state["chart_rules_task"] = None
+    return chart_rules
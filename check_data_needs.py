@@ -2,6 +2,12 @@ import google.generativeai as genai
 import os
 import json # For pretty-printing user data and parsing Gemini's JSON response
 import asyncio # <--- ADDED for asyncio.to_thread
+import logging
+from typing import Sequence
+from intent_classifier import classify_intent, missing_required_fields
+from metrics import ASSESSMENTS, llm_call_span
+
+logger = logging.getLogger(__name__)
 
 # Configure Gemini API (ensure GEMINI_API_KEY is set in your environment variables)
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
@@ -13,10 +19,15 @@ model = genai.GenerativeModel("gemini-2.5-flash-lite-preview-06-17")
 # --- CRITICAL FIX 2: Keep the function itself async ---
 async def check_for_additional_data(user_data: dict, user_query: str) -> dict:
     """
-    Uses Gemini to determine if additional, minimal information is needed from the user
+    Determines if additional, minimal information is needed from the user
     to provide a more precise astrological prediction for the given query,
     and returns the assessment as a structured JSON object.
 
+    The question is first classified locally (see intent_classifier.py). When
+    its topic is clear and every on_demand field the topic requires is filled
+    in, no data is needed and Gemini is not called. Otherwise Gemini assesses
+    the question, and is told which required fields are missing.
+
     Args:
         user_data (dict): A dictionary containing available user astrological data
                           (basic_data, on_demand_data, planets, etc.).
@@ -33,9 +44,44 @@ async def check_for_additional_data(user_data: dict, user_query: str) -> dict:
               }
               Returns an error dictionary if communication or parsing fails.
     """
+    intent = classify_intent(user_query)
+    missing_fields = ()
+    if intent.confident:
+        missing_fields = missing_required_fields(intent.topic, user_data.get("on_demand_data") or {})
+        if not missing_fields:
+            ASSESSMENTS.labels("local", intent.topic).inc()
+            logger.debug("Question classified as %r with all required fields present; skipping Gemini.", intent.topic)
+            return {"data_needs_from_user": False, "number_of_question": 0, "question_list": []}
+        ASSESSMENTS.labels("llm_missing_fields", intent.topic).inc()
+    else:
+        ASSESSMENTS.labels("llm_unsure", "none").inc()
+
+    return await assess_with_gemini(user_data, user_query, missing_fields)
+
+
+async def assess_with_gemini(user_data: dict, user_query: str, required_fields: Sequence[str] = ()) -> dict:
+    """
+    Asks Gemini for the data-need assessment of `check_for_additional_data`.
+
+    Args:
+        user_data (dict): The user's record.
+        user_query (str): The user's question.
+        required_fields: on_demand_data titles Gemini must ask for.
+
+    Returns:
+        dict: Gemini's assessment, or an error dictionary.
+    """
     # Format user_data into a readable JSON string for the LLM
     formatted_user_data = json.dumps(user_data, indent=2)
 
+    required_fields_note = ""
+    if required_fields:
+        required_fields_note = (
+            "\nThis kind of question requires the following fields, which are missing from the user's "
+            "on_demand_data. Ask for each of them, using exactly these titles: "
+            + ", ".join(required_fields) + "\n"
+        )
+
     prompt = f"""
 You are an intelligent astrology data assistant. Your task is to review a user's question and their currently available profile data.
 
@@ -58,6 +104,7 @@ Here is the exact JSON schema you must follow:
   ]
 }}
 ```
+{required_fields_note}
 User Query: "{user_query}"
 
 Current User Data:
@@ -66,7 +113,8 @@ Current User Data:
 
     # --- CRITICAL FIX 3: Use asyncio.to_thread to run synchronous LLM call asynchronously ---
     try:
-        response = await asyncio.to_thread(model.generate_content, prompt)
+        with llm_call_span("assessment", prompt):
+            response = await asyncio.to_thread(model.generate_content, prompt)
         gemini_text_response = response.text.strip()
         
         if gemini_text_response.startswith("```json") and gemini_text_response.endswith("```"):
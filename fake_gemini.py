@@ -0,0 +1,202 @@
+"""
+Offline stand-in for `genai.GenerativeModel`, for benchmarks, load tests and
+local runs without an API key or network.
+
+`FakeGenerativeModel.generate_content` recognises the three prompts this
+repo sends (data-needs assessment, similarity re-rank, prediction) and
+answers each deterministically: the same prompt always gets the same reply,
+unless canned replies are configured. Optionally every call sleeps for a
+latency drawn from a distribution and fails at a given error rate, like the
+real API under load.
+
+`install_fake_gemini()` swaps it in for the module-level `model` of
+check_data_needs.py, retrieve_index_of_similar_question.py and
+prediction_of_user_query.py. The app does this at import when FAKE_GEMINI=1,
+configured by (see `FakeGenerativeModel.from_env`):
+
+    FAKE_GEMINI_LATENCY      "fixed:0.4", "uniform:0.2,1.5", "normal:0.8,0.2" or
+                             "lognormal:0.8,0.5" (median seconds, sigma); default no latency
+    FAKE_GEMINI_ERROR_RATE   probability (0-1) that a call raises; default 0
+    FAKE_GEMINI_ASSESSMENT   JSON returned for data-needs assessment prompts
+    FAKE_GEMINI_PREDICTION   text returned for prediction prompts
+    FAKE_GEMINI_SEED         seed for latency / error draws
+"""
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from typing import Callable, Iterator, List, Optional, Union
+
+# Prompt fingerprints, matched against the prompts built in this repo.
+ASSESSMENT_MARKER = '"data_needs_from_user"'
+RERANK_MARKER = "semantic match engine"
+
+DEFAULT_ASSESSMENT = {"data_needs_from_user": False, "number_of_question": 0, "question_list": []}
+
+_PREDICTION_SENTENCES = [
+    "Aane wala samay aapke liye shubh sanket la raha hai.",
+    "Dhairya aur mehnat se kaam lein, parinaam achhe honge.",
+    "Parivar ka sahyog aapko milta rahega.",
+    "Arthik maamlon mein soch-samajh kar nirnay lein.",
+    "Swasthya par thoda dhyan dena zaroori hai.",
+    "Naye avsar aapke darwaze par dastak de sakte hain.",
+]
+_RERANK_LINE_PATTERN = re.compile(r'^(\d+)\. ', re.MULTILINE)
+_NAME_PATTERN = re.compile(r'"Name": "([^"]*)"')
+
+# Share of a streamed call's latency spent before the first chunk.
+FIRST_CHUNK_LATENCY_SHARE = 0.3
+
+
+class FakeGeminiError(Exception):
+    """Raised for calls the fake model is configured to fail."""
+
+
+def parse_latency(spec: Optional[str]) -> Callable[[random.Random], float]:
+    """
+    Parses a latency distribution spec into a sampler returning seconds.
+
+    Args:
+        spec (str): "fixed:S", "uniform:LOW,HIGH", "normal:MEAN,STD" or
+                    "lognormal:MEDIAN,SIGMA" (all in seconds); empty for no latency.
+
+    Raises:
+        ValueError: If the spec is malformed.
+    """
+    if not spec:
+        return lambda rng: 0.0
+    kind, _, params = spec.partition(":")
+    try:
+        values = [float(v) for v in params.split(",")] if params else []
+    except ValueError:
+        raise ValueError(f"Invalid latency parameters in '{spec}'")
+    kind = kind.strip().lower()
+    if kind == "fixed" and len(values) == 1:
+        return lambda rng: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda rng: rng.uniform(values[0], values[1])
+    if kind == "normal" and len(values) == 2:
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal" and len(values) == 2:
+        return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Invalid latency spec '{spec}'")
+
+
+class FakeResponse:
+    """Mimics the `.text` attribute of a Gemini response (or streamed chunk)."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """
+    Drop-in replacement for `genai.GenerativeModel`.
+
+    Args:
+        model_name (str): Accepted for signature compatibility; unused.
+        assessment (dict): JSON returned for data-needs assessment prompts.
+        rerank_top_k (int): How many candidate lines to return for re-rank prompts.
+        latency (str): Latency distribution spec (see `parse_latency`).
+        error_rate (float): Probability that a call raises FakeGeminiError.
+        prediction_text (str): Canned reply for prediction prompts; by default
+                               a deterministic text derived from the prompt.
+        seed (int): Seed for the latency / error draws.
+    """
+
+    def __init__(self, model_name: str = "fake-gemini", assessment: Optional[dict] = None, rerank_top_k: int = 5,
+                 latency: Optional[str] = None, error_rate: float = 0.0, prediction_text: Optional[str] = None,
+                 seed: Optional[int] = None):
+        self.model_name = model_name
+        self.assessment = assessment if assessment is not None else DEFAULT_ASSESSMENT
+        self.rerank_top_k = rerank_top_k
+        self.sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.prediction_text = prediction_text
+        self._rng = random.Random(seed)
+        # generate_content is called from worker threads.
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls) -> "FakeGenerativeModel":
+        """Builds a model configured by the FAKE_GEMINI_* environment variables."""
+        assessment = os.getenv("FAKE_GEMINI_ASSESSMENT")
+        seed = os.getenv("FAKE_GEMINI_SEED")
+        return cls(
+            assessment=json.loads(assessment) if assessment else None,
+            latency=os.getenv("FAKE_GEMINI_LATENCY"),
+            error_rate=float(os.getenv("FAKE_GEMINI_ERROR_RATE", "0")),
+            prediction_text=os.getenv("FAKE_GEMINI_PREDICTION"),
+            seed=int(seed) if seed else None,
+        )
+
+    def reply_for(self, prompt: str) -> str:
+        """Returns the text this model answers `prompt` with."""
+        if ASSESSMENT_MARKER in prompt:
+            return json.dumps(self.assessment)
+        if RERANK_MARKER in prompt:
+            return ", ".join(_RERANK_LINE_PATTERN.findall(prompt)[:self.rerank_top_k])
+        return self.prediction_text or self._prediction(prompt)
+
+    @staticmethod
+    def _prediction(prompt: str) -> str:
+        seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16)
+        name_match = _NAME_PATTERN.search(prompt)
+        name = name_match.group(1) if name_match else "ji"
+        sentences = [_PREDICTION_SENTENCES[(seed >> (8 * i)) % len(_PREDICTION_SENTENCES)] for i in range(3)]
+        return f"Namaste {name},\n\n" + " ".join(sentences) + "\n\nShubhkamnayein!"
+
+    def _draw(self):
+        """Returns (latency seconds, whether this call fails)."""
+        with self._lock:
+            self.calls += 1
+            latency = self.sample_latency(self._rng)
+            fails = self._rng.random() < self.error_rate
+            if fails:
+                self.errors += 1
+        return latency, fails
+
+    def generate_content(self, prompt: str, stream: bool = False) -> Union[FakeResponse, Iterator[FakeResponse]]:
+        latency, fails = self._draw()
+        text = self.reply_for(prompt)
+        if stream:
+            return self._stream(text, latency, fails)
+        # Blocking, like the real client; callers run it in a worker thread.
+        time.sleep(latency)
+        if fails:
+            raise FakeGeminiError("Simulated Gemini failure")
+        return FakeResponse(text)
+
+    @staticmethod
+    def _stream(text: str, latency: float, fails: bool) -> Iterator[FakeResponse]:
+        time.sleep(latency * FIRST_CHUNK_LATENCY_SHARE)
+        if fails:
+            raise FakeGeminiError("Simulated Gemini failure")
+        chunks = re.findall(r'\S+\s*', text)
+        per_chunk = latency * (1 - FIRST_CHUNK_LATENCY_SHARE) / max(len(chunks), 1)
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(per_chunk)
+            yield FakeResponse(chunk)
+
+
+def install_fake_gemini(model: Optional[FakeGenerativeModel] = None) -> FakeGenerativeModel:
+    """
+    Replaces the Gemini model used by every module of the app with `model`
+    (a new FakeGenerativeModel by default) and returns it.
+    """
+    import check_data_needs
+    import prediction_of_user_query
+    import retrieve_index_of_similar_question
+
+    model = model or FakeGenerativeModel()
+    modules: List = [check_data_needs, retrieve_index_of_similar_question, prediction_of_user_query]
+    for module in modules:
+        module.model = model
+    return model
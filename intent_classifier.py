@@ -0,0 +1,90 @@
+import re
+from typing import Dict, FrozenSet, NamedTuple, Optional, Tuple
+from similarity_engine import normalize_text
+
+# Words that mark a question's topic, as typed (English / Hinglish) or in
+# Devanagari. Roman words the similarity lexicon knows are also caught through
+# their Devanagari form, so both spellings only need to be listed once.
+TOPIC_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "love": (
+        "love", "pyar", "pyaar", "prem", "relationship", "girlfriend", "boyfriend", "gf", "bf", "partner",
+        "crush", "dating", "breakup", "marriage", "marry", "married", "shaadi", "shadi", "vivah", "rishta",
+        "spouse", "husband", "wife", "pati", "patni", "romance",
+        "प्रेम", "प्यार", "संबंध", "विवाह", "शादी", "रिश्ता", "पति", "पत्नी", "जीवनसाथी",
+    ),
+    "career": (
+        "career", "job", "jobs", "naukri", "nokri", "naukari", "promotion", "office", "boss", "business",
+        "vyapar", "vyaapar", "work", "kaam", "interview", "startup", "company", "profession", "transfer",
+        "नौकरी", "करियर", "व्यापार", "व्यवसाय", "कार्य", "पदोन्नति",
+    ),
+    "health": (
+        "health", "sehat", "sehet", "swasthya", "bimari", "illness", "disease", "tabiyat", "surgery",
+        "hospital", "doctor", "fitness",
+        "सेहत", "स्वास्थ्य", "बीमारी", "तबीयत", "रोग",
+    ),
+    "finance": (
+        "money", "paisa", "paise", "dhan", "wealth", "finance", "financial", "arthik", "investment", "nivesh",
+        "loan", "karz", "karza", "debt", "income", "salary", "savings", "property", "stocks", "profit", "labh",
+        "पैसा", "धन", "आर्थिक", "निवेश", "कर्ज", "लाभ", "संपत्ति",
+    ),
+}
+
+# on_demand_data fields a prediction needs for each topic. A question about a
+# topic whose fields are all filled in needs no assessment by Gemini. Only
+# fields the existing follow-up flow already collects are listed; an empty
+# tuple means the birth details are enough.
+TOPIC_REQUIRED_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "love": ("relationship_status",),
+    "career": (),
+    "health": (),
+    "finance": (),
+}
+
+_ROMAN_WORD_PATTERN = re.compile(r"[a-z]+")
+
+# Keywords in the same normalized form the question is reduced to.
+_TOPIC_VOCABULARY: Dict[str, FrozenSet[str]] = {
+    topic: frozenset(
+        keyword if keyword.isascii() else normalize_text(keyword)
+        for keyword in keywords
+    )
+    for topic, keywords in TOPIC_KEYWORDS.items()
+}
+
+
+class IntentClassification(NamedTuple):
+    # The question's topic, or None when no topic (or more than one) matched.
+    topic: Optional[str]
+    # Number of distinct keywords matched per topic (topics without a match are left out).
+    matches: Dict[str, int]
+
+    @property
+    def confident(self) -> bool:
+        return self.topic is not None
+
+
+def classify_intent(user_query: str) -> IntentClassification:
+    """
+    Maps a question to one of the TOPIC_KEYWORDS topics, offline.
+
+    The classifier is only confident when the question matches keywords of
+    exactly one topic; questions touching several topics (or none) are left
+    to Gemini.
+    """
+    words = set(_ROMAN_WORD_PATTERN.findall(user_query.lower()))
+    words.update(normalize_text(user_query).split())
+    matches = {
+        topic: len(vocabulary & words)
+        for topic, vocabulary in _TOPIC_VOCABULARY.items()
+        if not vocabulary.isdisjoint(words)
+    }
+    topic = next(iter(matches)) if len(matches) == 1 else None
+    return IntentClassification(topic, matches)
+
+
+def missing_required_fields(topic: str, on_demand_data: Dict[str, str]) -> Tuple[str, ...]:
+    """Returns the fields TOPIC_REQUIRED_FIELDS lists for `topic` that have no answer yet."""
+    return tuple(
+        field for field in TOPIC_REQUIRED_FIELDS.get(topic, ())
+        if not str(on_demand_data.get(field) or "").strip()
+    )
@@ -0,0 +1,357 @@
+"""
+Compiled, memory-mappable form of the Excel knowledge bank.
+
+Parsing the .xlsx and compiling every Condition is the slow part of startup
+and every worker process would otherwise repeat it. The build step writes a
+single binary file next to the sheet holding the rule texts, the compiled
+predicates and the planet / time / similarity index arrays, keyed by the
+sha256 of the .xlsx bytes:
+
+    python kb_artifact.py                                  # compiles EXCEL_FILE
+    python kb_artifact.py --excel-file kb.xlsx --output kb.kbc
+
+`KnowledgeBank.load()` maps the file read-only when its key matches the
+sheet, so uvicorn workers share the same page-cache pages instead of each
+holding a parsed copy, and falls back to parsing the Excel file (and
+rewriting the artifact) when the sheet has changed.
+
+Layout: a 16-byte preamble (magic, format version, header length), a JSON
+header (hashes, compile errors, planet index keys and the section table),
+then 8-byte aligned sections of native-endian int32 / int64 / float64 arrays
+and UTF-8 blobs.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Mapping
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Sequence
+from rule_compiler import SHORT_PLANET_NAMES, CompiledCondition, Conjunction, NotWith, PlanetInHouse
+from rule_index import IntervalTreeArrays, PlanetHouseIndex, PostingArrays, TimeWindowIndex
+from similarity_engine import ResultSimilarityIndex, SimilarityArrays
+
+logger = logging.getLogger(__name__)
+
+# Overrides where the artifact lives; empty disables it. Default: the sheet's path with a .kbc suffix.
+ARTIFACT_FILE = os.getenv("KB_ARTIFACT_FILE")
+
+MAGIC = b"ASTROKB\0"
+# Bump whenever the layout or the meaning of any section changes.
+FORMAT_VERSION = 1
+_PREAMBLE = struct.Struct("<8sII")
+_ALIGNMENT = 8
+
+_PLANET_CODES = {planet: code for code, planet in enumerate(SHORT_PLANET_NAMES)}
+
+
+def artifact_path_for(excel_file: str) -> str:
+    """Returns where the compiled artifact for `excel_file` is kept ("" when disabled)."""
+    if ARTIFACT_FILE is not None:
+        return ARTIFACT_FILE
+    return os.path.splitext(excel_file)[0] + ".kbc"
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def encode_condition(condition: CompiledCondition) -> List[int]:
+    """
+    Flattens a compiled condition into ints: each predicate group is prefixed
+    with its length, and AGE / TIME with -1 when the clause is absent.
+    Planets are indexes into SHORT_PLANET_NAMES and dates are ordinals.
+    """
+    codes = [len(condition.in_house)]
+    for predicate in condition.in_house:
+        codes += [_PLANET_CODES[predicate.planet], len(predicate.houses), *sorted(predicate.houses)]
+    for pairs in (condition.conjunctions, condition.not_with):
+        codes.append(len(pairs))
+        for pair in pairs:
+            codes += [_PLANET_CODES[pair.planet], _PLANET_CODES[pair.other]]
+    if condition.ages is None:
+        codes.append(-1)
+    else:
+        codes += [len(condition.ages), *sorted(condition.ages)]
+    if condition.time_windows is None:
+        codes.append(-1)
+    else:
+        codes.append(len(condition.time_windows))
+        for start, end in condition.time_windows:
+            codes += [start.toordinal(), end.toordinal()]
+    return codes
+
+
+def decode_condition(codes: Sequence[int]) -> CompiledCondition:
+    """Inverse of `encode_condition`."""
+    position = 0
+
+    def take(count: int) -> Sequence[int]:
+        nonlocal position
+        position += count
+        return codes[position - count:position]
+
+    in_house = []
+    for _ in range(take(1)[0]):
+        planet, house_count = take(2)
+        in_house.append(PlanetInHouse(SHORT_PLANET_NAMES[planet], frozenset(take(house_count))))
+    pair_groups = []
+    for pair_type in (Conjunction, NotWith):
+        pair_groups.append(tuple(
+            pair_type(SHORT_PLANET_NAMES[planet], SHORT_PLANET_NAMES[other])
+            for planet, other in (take(2) for _ in range(take(1)[0]))
+        ))
+    age_count = take(1)[0]
+    ages = None if age_count == -1 else frozenset(take(age_count))
+    window_count = take(1)[0]
+    time_windows = None
+    if window_count != -1:
+        time_windows = tuple(
+            (date.fromordinal(start), date.fromordinal(end))
+            for start, end in (take(2) for _ in range(window_count))
+        )
+    return CompiledCondition(tuple(in_house), pair_groups[0], pair_groups[1], ages, time_windows)
+
+
+class ArtifactRows(Mapping):
+    """Read-only {Excel row number: {"number", "condition", "result"}} view decoding from the mapped text blob."""
+
+    def __init__(self, positions: Dict[int, int], text_offsets: Sequence[int], text_blob: memoryview):
+        self._positions = positions
+        self._text_offsets = text_offsets
+        self._text_blob = text_blob
+
+    def __getitem__(self, idx: int) -> Dict[str, str]:
+        position = self._positions[idx]
+        offsets = self._text_offsets[3 * position:3 * position + 4]
+        number, condition, result = (
+            str(self._text_blob[offsets[field]:offsets[field + 1]], "utf-8") for field in range(3)
+        )
+        return {"number": number, "condition": condition, "result": result}
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._positions)
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+
+class ArtifactConditions(Mapping):
+    """
+    Read-only {Excel row number: CompiledCondition} view over the encoded
+    predicates. Rows that failed to compile have no entry. Conditions are
+    decoded on first access and kept.
+    """
+
+    def __init__(self, positions: Dict[int, int], condition_offsets: Sequence[int], condition_codes: Sequence[int],
+                 compiled_count: int):
+        self._positions = positions
+        self._condition_offsets = condition_offsets
+        self._condition_codes = condition_codes
+        self._compiled_count = compiled_count
+        self._decoded: Dict[int, CompiledCondition] = {}
+
+    def _span(self, idx: int):
+        position = self._positions[idx]
+        return self._condition_offsets[position], self._condition_offsets[position + 1]
+
+    def __getitem__(self, idx: int) -> CompiledCondition:
+        condition = self._decoded.get(idx)
+        if condition is None:
+            start, end = self._span(idx)
+            if start == end:
+                raise KeyError(idx)
+            condition = self._decoded[idx] = decode_condition(self._condition_codes[start:end])
+        return condition
+
+    def __contains__(self, idx) -> bool:
+        if idx in self._decoded:
+            return True
+        if idx not in self._positions:
+            return False
+        start, end = self._span(idx)
+        return start != end
+
+    def __iter__(self) -> Iterator[int]:
+        return (idx for idx in self._positions if idx in self)
+
+    def __len__(self) -> int:
+        return self._compiled_count
+
+
+class KnowledgeBankArtifact:
+    """Everything `KnowledgeBank` needs, served from one read-only memory map."""
+
+    def __init__(self, path: str, header: dict, sections: Dict[str, memoryview]):
+        self.path = path
+        self.source_hash = header["source_hash"]
+        self.content_hash = header["content_hash"]
+        self.compile_errors = {int(idx): error for idx, error in header["compile_errors"].items()}
+
+        positions = {idx: position for position, idx in enumerate(sections["row_ids"])}
+        self.rows = ArtifactRows(positions, sections["text_offsets"], sections["text_blob"])
+        self.compiled = ArtifactConditions(
+            positions, sections["condition_offsets"], sections["condition_codes"],
+            len(positions) - len(self.compile_errors),
+        )
+        self.planet_index = PlanetHouseIndex(
+            [tuple(key) for key in header["planet_keys"]],
+            PostingArrays(*(sections[f"planet.{field}"] for field in PostingArrays._fields)),
+        )
+        self.time_index = TimeWindowIndex(
+            IntervalTreeArrays(*(sections[f"time.{field}"] for field in IntervalTreeArrays._fields))
+        )
+        grams = str(sections["similarity.grams"], "utf-8").split("\n") if len(sections["similarity.grams"]) else []
+        self.similarity_index = ResultSimilarityIndex(
+            grams, SimilarityArrays(*(sections[f"similarity.{field}"] for field in SimilarityArrays._fields))
+        )
+
+
+def _artifact_sections(knowledge_bank) -> Dict[str, tuple]:
+    """Returns {section name: (typecode, values)} in file order."""
+    row_ids, text_offsets, text_chunks = [], [0], []
+    condition_offsets, condition_codes = [0], []
+    for idx, row in knowledge_bank.rows.items():
+        row_ids.append(idx)
+        for field in ("number", "condition", "result"):
+            encoded = row[field].encode("utf-8")
+            text_chunks.append(encoded)
+            text_offsets.append(text_offsets[-1] + len(encoded))
+        if idx in knowledge_bank.compiled:
+            condition_codes += encode_condition(knowledge_bank.compiled[idx])
+        condition_offsets.append(len(condition_codes))
+
+    similarity = knowledge_bank.similarity_index
+    sections = {
+        "row_ids": ("i", row_ids),
+        "text_offsets": ("q", text_offsets),
+        "text_blob": ("B", b"".join(text_chunks)),
+        "condition_offsets": ("i", condition_offsets),
+        "condition_codes": ("i", condition_codes),
+        "similarity.grams": ("B", "\n".join(similarity.grams).encode("utf-8")),
+    }
+    indexes = (("planet", knowledge_bank.planet_index), ("time", knowledge_bank.time_index), ("similarity", similarity))
+    for prefix, index in indexes:
+        for field, values in index.arrays._asdict().items():
+            sections[f"{prefix}.{field}"] = ("d" if field in ("idf", "posting_weights") else "i", values)
+    return sections
+
+
+def _section_bytes(typecode: str, values) -> bytes:
+    if typecode == "B":
+        return bytes(values)
+    if not (isinstance(values, array) and values.typecode == typecode):
+        values = array(typecode, values)
+    return values.tobytes()
+
+
+def _align(offset: int) -> int:
+    return -(-offset // _ALIGNMENT) * _ALIGNMENT
+
+
+def write_artifact(path: str, knowledge_bank, source_hash: str):
+    """
+    Writes `knowledge_bank` (already loaded) as a compiled artifact keyed by
+    `source_hash`. The file is written under a temporary name and renamed into
+    place, so concurrent readers only ever see a complete artifact.
+    """
+    header = {
+        "source_hash": source_hash,
+        "content_hash": knowledge_bank.content_hash,
+        "byteorder": sys.byteorder,
+        "compile_errors": {str(idx): error for idx, error in knowledge_bank.compile_errors.items()},
+        "planet_keys": [list(key) for key in knowledge_bank.planet_index.keys],
+        "sections": {},
+    }
+    payloads = []
+    offset = 0
+    for name, (typecode, values) in _artifact_sections(knowledge_bank).items():
+        payload = _section_bytes(typecode, values)
+        offset = _align(offset)
+        header["sections"][name] = [typecode, offset, len(payload)]
+        payloads.append((offset, payload))
+        offset += len(payload)
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    data_start = _align(_PREAMBLE.size + len(header_bytes))
+
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+            f.write(header_bytes)
+            for section_offset, payload in payloads:
+                f.seek(data_start + section_offset)
+                f.write(payload)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def read_artifact(path: str, source_hash: str) -> Optional[KnowledgeBankArtifact]:
+    """
+    Memory-maps the artifact at `path` if it was compiled from a sheet with
+    `source_hash` by this format version; returns None (after logging why)
+    when it is missing, stale or unreadable, so the caller parses the sheet.
+    """
+    try:
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        logger.info("No compiled knowledge bank at '%s'.", path)
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning("Could not map compiled knowledge bank '%s': %s", path, e)
+        return None
+
+    try:
+        magic, version, header_length = _PREAMBLE.unpack_from(mapped)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            logger.info("Compiled knowledge bank '%s' has format %s, expected %s.", path, version, FORMAT_VERSION)
+            return None
+        header = json.loads(str(mapped[_PREAMBLE.size:_PREAMBLE.size + header_length], "utf-8"))
+        if header["source_hash"] != source_hash or header["byteorder"] != sys.byteorder:
+            logger.info("Compiled knowledge bank '%s' is out of date.", path)
+            return None
+
+        data_start = _align(_PREAMBLE.size + header_length)
+        view = memoryview(mapped)
+        sections = {}
+        for name, (typecode, offset, length) in header["sections"].items():
+            start = data_start + offset
+            if start + length > len(mapped):
+                raise ValueError(f"section '{name}' runs past the end of the file")
+            sections[name] = view[start:start + length].cast(typecode)
+        return KnowledgeBankArtifact(path, header, sections)
+    except (KeyError, TypeError, ValueError, struct.error) as e:
+        logger.warning("Ignoring unreadable compiled knowledge bank '%s': %s", path, e)
+        return None
+
+
+def main():
+    from knowledge_bank import EXCEL_FILE, KnowledgeBank
+
+    parser = argparse.ArgumentParser(description="Compile the Excel knowledge bank into a memory-mappable artifact.")
+    parser.add_argument("--excel-file", default=EXCEL_FILE)
+    parser.add_argument("--output", help="artifact path (default: the sheet's path with a .kbc suffix)")
+    args = parser.parse_args()
+
+    output = args.output or artifact_path_for(args.excel_file) or os.path.splitext(args.excel_file)[0] + ".kbc"
+    knowledge_bank = KnowledgeBank(args.excel_file, artifact_file="").load_excel()
+    write_artifact(output, knowledge_bank, file_sha256(args.excel_file))
+    print(f"Compiled {len(knowledge_bank)} rules from '{args.excel_file}' into '{output}' "
+          f"({os.path.getsize(output) / 1e6:.1f} MB).")
+
+
+if __name__ == "__main__":
+    main()
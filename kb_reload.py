@@ -0,0 +1,125 @@
+"""
+Hot reload of the knowledge bank.
+
+`watch_knowledge_bank` polls the Excel file; when it changes, a new
+`KnowledgeBank` snapshot is built in a worker thread (artifact or sheet
+parse, every index, today's rendered blocks), validated, and only then
+installed as the shared instance. A file that fails to parse or validate is
+logged and ignored, so the previous rules keep serving.
+
+Snapshots are immutable and swapped by rebinding one reference, so a chat
+turn wrapped in `pinned_knowledge_bank()` finishes on the version it
+started with; the old snapshot is freed once its last turn ends.
+"""
+import asyncio
+import logging
+import os
+from typing import Optional, Tuple
+from knowledge_bank import EXCEL_FILE, KnowledgeBank, get_knowledge_bank, pinned_knowledge_bank, set_knowledge_bank
+from metrics import KB_RELOADS
+from retrieve_astro_chart import get_rendered_rules
+
+logger = logging.getLogger(__name__)
+
+# How often the Excel file is checked for changes; 0 disables the watcher.
+KB_RELOAD_INTERVAL_SECONDS = float(os.getenv("KB_RELOAD_INTERVAL_SECONDS", "30"))
+# Largest share of rules whose Condition may fail to compile in a new version.
+KB_MAX_COMPILE_ERROR_RATE = float(os.getenv("KB_MAX_COMPILE_ERROR_RATE", "0.05"))
+# A new version with fewer rules than this share of the current one is rejected
+# (usually a truncated upload or the wrong sheet).
+KB_MIN_ROW_RATIO = float(os.getenv("KB_MIN_ROW_RATIO", "0.5"))
+
+
+class KnowledgeBankValidationError(ValueError):
+    """Raised when a rebuilt knowledge bank is not safe to serve."""
+
+
+def validate_knowledge_bank(candidate: KnowledgeBank, current: Optional[KnowledgeBank] = None):
+    """
+    Checks a freshly built snapshot before it is served.
+
+    Raises:
+        KnowledgeBankValidationError: If it has no rules, too many rules that
+            failed to compile, or far fewer rules than `current`.
+    """
+    if not len(candidate):
+        raise KnowledgeBankValidationError(f"'{candidate.excel_file}' contains no rules")
+    error_rate = len(candidate.compile_errors) / len(candidate)
+    if error_rate > KB_MAX_COMPILE_ERROR_RATE:
+        raise KnowledgeBankValidationError(
+            f"{len(candidate.compile_errors)} of {len(candidate)} conditions failed to compile "
+            f"(limit {KB_MAX_COMPILE_ERROR_RATE:.0%})"
+        )
+    if current is not None and len(candidate) < KB_MIN_ROW_RATIO * len(current):
+        raise KnowledgeBankValidationError(
+            f"rule count dropped from {len(current)} to {len(candidate)} (limit {KB_MIN_ROW_RATIO:.0%})"
+        )
+
+
+def build_knowledge_bank(excel_file: str = EXCEL_FILE) -> KnowledgeBank:
+    """
+    Builds and validates a new snapshot, including today's rendered rule
+    blocks, without installing it. Blocking; run it off the event loop.
+
+    Raises:
+        KnowledgeBankValidationError: If the new rules fail validation.
+    """
+    candidate = KnowledgeBank(excel_file).load()
+    validate_knowledge_bank(candidate, get_knowledge_bank())
+    # Rendering touches every rule, so a Condition that breaks formatting fails
+    # here instead of on the first question; it also warms the render cache.
+    with pinned_knowledge_bank(candidate):
+        get_rendered_rules()
+    return candidate
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+async def reload_knowledge_bank(excel_file: str = EXCEL_FILE) -> bool:
+    """
+    Rebuilds the knowledge bank off the event loop and swaps it in if it is
+    valid and its content changed.
+
+    Returns:
+        bool: True if a new version was installed.
+    """
+    current = get_knowledge_bank()
+    try:
+        candidate = await asyncio.to_thread(build_knowledge_bank, excel_file)
+    except KnowledgeBankValidationError as e:
+        KB_RELOADS.labels("invalid").inc()
+        logger.error("Rejected knowledge bank update from '%s': %s. Still serving version %s.",
+                     excel_file, e, current.version)
+        return False
+    except Exception as e:
+        KB_RELOADS.labels("error").inc()
+        logger.exception("Could not load knowledge bank update from '%s': %s. Still serving version %s.",
+                         excel_file, e, current.version)
+        return False
+
+    if candidate.content_hash == current.content_hash:
+        return False
+    set_knowledge_bank(candidate)
+    KB_RELOADS.labels("swapped").inc()
+    logger.info("Knowledge bank reloaded: version %s -> %s (%d rules).", current.version, candidate.version, len(candidate))
+    return True
+
+
+async def watch_knowledge_bank(excel_file: str = EXCEL_FILE, interval: float = KB_RELOAD_INTERVAL_SECONDS):
+    """Polls `excel_file` every `interval` seconds and hot-reloads it when its mtime or size changes."""
+    last_signature = _file_signature(excel_file)
+    while True:
+        await asyncio.sleep(interval)
+        signature = _file_signature(excel_file)
+        if signature is None or signature == last_signature:
+            continue
+        # Recorded even if the reload fails: a half-written file gets a new
+        # signature once the editor finishes saving, which triggers a retry.
+        last_signature = signature
+        await reload_knowledge_bank(excel_file)
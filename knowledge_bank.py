@@ -0,0 +1,220 @@
+import hashlib
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+import pandas as pd
+import pytz
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Mapping, Optional
+from kb_artifact import KnowledgeBankArtifact, artifact_path_for, file_sha256, read_artifact, write_artifact
+from rule_compiler import CompiledCondition, compile_condition
+from rule_index import PlanetHouseIndex, TimeWindowIndex
+from similarity_engine import ResultSimilarityIndex
+
+EXCEL_FILE = "Refined_Knowledge_Bank (1).xlsx"
+IST = pytz.timezone('Asia/Kolkata')
+
+logger = logging.getLogger(__name__)
+
+# Row 1 of the sheet is the header, so the first rule lives on Excel row 2.
+FIRST_EXCEL_ROW = 2
+
+
+class KnowledgeBank:
+    """
+    In-memory copy of the Excel knowledge bank.
+
+    The sheet is parsed once and every rule is kept in a dict keyed by its
+    Excel row number (1-indexed, header on row 1), which is the same numbering
+    the retrieval functions and the Gemini prompts already use. Each rule's
+    Condition is also compiled into predicates at load time; rows that fail to
+    compile are recorded in `compile_errors` and left out of `compiled`.
+    The compiled predicates are then indexed by (planet, house) and planet
+    pair so chart matching only touches candidate rules, and their TIME
+    windows go into an interval index that answers "which rules are active
+    on this day". The Result texts are indexed for local similarity search.
+
+    All of that is also compiled into a binary artifact next to the sheet
+    (see kb_artifact.py); `load()` memory-maps it instead of parsing the
+    sheet whenever it was built from the same .xlsx bytes.
+    """
+
+    def __init__(self, excel_file: str = EXCEL_FILE, artifact_file: Optional[str] = None):
+        self.excel_file = excel_file
+        # "" disables the compiled artifact (always parse the sheet).
+        self.artifact_file = artifact_path_for(excel_file) if artifact_file is None else artifact_file
+        # The file the rules were actually read from: the sheet or the artifact.
+        self.source = excel_file
+        self.rows: Mapping[int, Dict[str, str]] = {}
+        self.content_hash = ""
+        # sha256 of the .xlsx bytes this snapshot was built from (set by `load()`).
+        self.source_hash = ""
+        self.compiled: Mapping[int, CompiledCondition] = {}
+        self.compile_errors: Dict[int, str] = {}
+        self.planet_index = PlanetHouseIndex.from_compiled({})
+        self.time_index = TimeWindowIndex.from_compiled({})
+        self.similarity_index = ResultSimilarityIndex.from_results({})
+
+    def load(self) -> "KnowledgeBank":
+        """
+        (Re)populates the store from the compiled artifact when it matches the
+        Excel file's content hash; otherwise parses the sheet and recompiles
+        the artifact for the next load.
+        """
+        source_hash = file_sha256(self.excel_file)
+        self.source_hash = source_hash
+        if not self.artifact_file:
+            return self.load_excel()
+
+        artifact = read_artifact(self.artifact_file, source_hash)
+        if artifact is not None:
+            return self.load_artifact(artifact)
+
+        self.load_excel()
+        try:
+            write_artifact(self.artifact_file, self, source_hash)
+            logger.info("Compiled knowledge bank to '%s'.", self.artifact_file)
+        except OSError as e:
+            logger.warning("Could not write compiled knowledge bank '%s': %s", self.artifact_file, e)
+        return self
+
+    def load_artifact(self, artifact: KnowledgeBankArtifact) -> "KnowledgeBank":
+        """(Re)populates the store from a memory-mapped compiled artifact."""
+        self.source = artifact.path
+        self.rows = artifact.rows
+        self.content_hash = artifact.content_hash
+        self.compiled = artifact.compiled
+        self.compile_errors = artifact.compile_errors
+        self.planet_index = artifact.planet_index
+        self.time_index = artifact.time_index
+        self.similarity_index = artifact.similarity_index
+        return self
+
+    def load_excel(self) -> "KnowledgeBank":
+        """Parses the Excel file and (re)populates the row store."""
+        self.source = self.excel_file
+        excel_df = pd.read_excel(self.excel_file)
+
+        rows = {}
+        for idx, row in enumerate(excel_df.itertuples(index=False), start=FIRST_EXCEL_ROW):
+            rows[idx] = {
+                "number": str(row.Number),
+                "condition": str(row.Condition),
+                "result": str(row.Result),
+            }
+        return self.load_rows(rows)
+
+    def load_rows(self, rows: Dict[int, Dict[str, str]]) -> "KnowledgeBank":
+        """
+        (Re)populates the store from rows already in memory, keyed by Excel row
+        number with "number" / "condition" / "result" fields, and rebuilds the
+        compiled predicates and indexes. Used directly for synthetic knowledge banks.
+        """
+        self.rows = rows
+        self.content_hash = self._hash_rows(rows)
+        self._compile_conditions()
+        self.planet_index = PlanetHouseIndex.from_compiled(self.compiled)
+        self.time_index = TimeWindowIndex.from_compiled(self.compiled)
+        self.similarity_index = ResultSimilarityIndex.from_results({idx: row["result"] for idx, row in rows.items()})
+        return self
+
+    @staticmethod
+    def _hash_rows(rows: Dict[int, Dict[str, str]]) -> str:
+        """Hashes the rule content so caches can tell knowledge bank versions apart."""
+        digest = hashlib.sha256()
+        for idx, row in rows.items():
+            digest.update(f"{idx}\x1f{row['condition']}\x1f{row['result']}\x1e".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _compile_conditions(self):
+        compiled = {}
+        compile_errors = {}
+        for idx, row in self.rows.items():
+            try:
+                compiled[idx] = compile_condition(row["condition"])
+            except ValueError as e:
+                compile_errors[idx] = str(e)
+                logger.warning("Skipping rule on Excel row %d (%s): %s", idx, row['number'], e)
+        self.compiled = compiled
+        self.compile_errors = compile_errors
+
+    @property
+    def version(self) -> str:
+        """Short content-hash label of this snapshot; identical across workers serving the same rules."""
+        return self.content_hash[:12]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __contains__(self, row_idx: int) -> bool:
+        return row_idx in self.rows
+
+    def row_numbers(self) -> List[int]:
+        """Returns all Excel row numbers in sheet order."""
+        return list(self.rows.keys())
+
+    def get_row(self, row_idx: int) -> Optional[Dict[str, str]]:
+        """Returns the stored row for an Excel row number, or None if out of bounds."""
+        return self.rows.get(row_idx)
+
+
+def today_in_ist() -> date:
+    """Returns the current calendar date in IST, the day all rule matching is done for."""
+    return datetime.now(IST).date()
+
+
+def seconds_until_next_ist_midnight() -> float:
+    """Returns how long until the IST date next changes."""
+    now = datetime.now(IST)
+    next_midnight = IST.localize(datetime.combine(now.date() + timedelta(days=1), datetime.min.time()))
+    return (next_midnight - now).total_seconds()
+
+
+# Process-wide instance, populated at app startup (or lazily on first use) and
+# replaced wholesale by hot reloads (see kb_reload.py); snapshots are never mutated.
+_knowledge_bank: Optional[KnowledgeBank] = None
+
+# Snapshot pinned by the current task (see `pinned_knowledge_bank`); asyncio
+# tasks and asyncio.to_thread workers started from it inherit the pin.
+_pinned_knowledge_bank: ContextVar[Optional[KnowledgeBank]] = ContextVar("pinned_knowledge_bank", default=None)
+
+
+def load_knowledge_bank(excel_file: str = EXCEL_FILE) -> KnowledgeBank:
+    """Loads the knowledge bank (compiled artifact or Excel) and installs it as the shared instance."""
+    global _knowledge_bank
+    _knowledge_bank = KnowledgeBank(excel_file).load()
+    logger.info("Loaded %d rules (version %s) from '%s'.", len(_knowledge_bank), _knowledge_bank.version, _knowledge_bank.source)
+    return _knowledge_bank
+
+
+def set_knowledge_bank(knowledge_bank: KnowledgeBank) -> KnowledgeBank:
+    """Installs an already-built knowledge bank as the shared instance."""
+    global _knowledge_bank
+    _knowledge_bank = knowledge_bank
+    return knowledge_bank
+
+
+def get_knowledge_bank() -> KnowledgeBank:
+    """Returns the pinned snapshot if there is one, else the shared knowledge bank (loading it on first access)."""
+    pinned = _pinned_knowledge_bank.get()
+    if pinned is not None:
+        return pinned
+    if _knowledge_bank is None:
+        return load_knowledge_bank()
+    return _knowledge_bank
+
+
+@contextmanager
+def pinned_knowledge_bank(knowledge_bank: Optional[KnowledgeBank] = None):
+    """
+    Pins a snapshot (default: the current one) for the enclosed block, so every
+    `get_knowledge_bank()` in it -- including tasks and threads started from
+    it -- sees the same version even if a reload swaps the shared instance.
+    """
+    if knowledge_bank is None:
+        knowledge_bank = get_knowledge_bank()
+    token = _pinned_knowledge_bank.set(knowledge_bank)
+    try:
+        yield knowledge_bank
+    finally:
+        _pinned_knowledge_bank.reset(token)
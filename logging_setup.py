@@ -0,0 +1,170 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import zlib
+from datetime import datetime, timezone
+from typing import Optional
+
+# Logging configuration, read once by `configure_logging`.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" (one object per line, for log shippers) or "text" (for local runs).
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Share of sessions (0-1) whose DEBUG / INFO records are kept; warnings and errors are always kept.
+LOG_SESSION_SAMPLE_RATE = float(os.getenv("LOG_SESSION_SAMPLE_RATE", "1.0"))
+# Records waiting for the writer thread; beyond this, new records are dropped instead of blocking.
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Third-party loggers that log every operation at DEBUG; kept at INFO even when LOG_LEVEL=DEBUG.
+NOISY_LOGGERS = ("aiosqlite", "asyncio", "httpcore", "httpx", "multipart", "websockets")
+
+# The session (mob) the current task is serving. Set per WebSocket connection;
+# asyncio tasks and asyncio.to_thread workers inherit it automatically.
+current_session: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_session", default=None)
+
+# Attributes every LogRecord has; anything else was passed via `extra=` and is emitted as a field.
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "mob"}
+
+
+def session_sampled(mob: str, rate: Optional[float] = None) -> bool:
+    """Deterministically decides whether a session's low-level records are kept."""
+    rate = LOG_SESSION_SAMPLE_RATE if rate is None else rate
+    if rate >= 1.0:
+        return True
+    return zlib.crc32(mob.encode("utf-8")) % 10000 < rate * 10000
+
+
+class SessionFilter(logging.Filter):
+    """
+    Tags records with the current session and applies per-session sampling.
+
+    Attached to the handler on the calling side, so dropped records are never
+    formatted or queued.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        mob = current_session.get()
+        record.mob = mob
+        if mob is None or record.levelno >= logging.WARNING:
+            return True
+        return session_sampled(mob)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "mob", None):
+            entry["mob"] = record.mob
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        # Queued records arrive with the traceback already formatted (see DroppingQueueHandler.prepare).
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s%(session)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        record.session = f" [{record.mob}]" if getattr(record, "mob", None) else ""
+        return super().format(record)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records when the queue is full, so callers never block."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Interpolates the message like QueueHandler.prepare, but keeps the
+        traceback out of it: it is formatted into `exc_text` here (the live
+        traceback is not passed to the writer thread) and emitted by the
+        formatter as its own field.
+        """
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[DroppingQueueHandler] = None
+_traceback_formatter = logging.Formatter()
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None):
+    """
+    Routes all logging through a bounded queue to a writer thread.
+
+    Records below the level are never created, and records of unsampled
+    sessions are dropped before their message is interpolated. For the rest,
+    callers on the event loop only interpolate the message and enqueue it;
+    JSON encoding and the write to stderr happen in the listener thread.
+    Safe to call more than once; only the first call takes effect.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(JsonFormatter() if (fmt or LOG_FORMAT) == "json" else TextFormatter())
+
+    _queue_handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    _queue_handler.addFilter(SessionFilter())
+
+    root = logging.getLogger()
+    root.handlers = [_queue_handler]
+    root.setLevel(level or LOG_LEVEL)
+    for name in NOISY_LOGGERS:
+        logging.getLogger(name).setLevel(max(root.level, logging.INFO))
+
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """
+    Flushes queued records and stops the writer thread. Records logged
+    afterwards are written directly by the stream handler.
+    """
+    global _listener
+    if _listener is not None:
+        root = logging.getLogger()
+        root.removeHandler(_queue_handler)
+        for handler in _listener.handlers:
+            root.addHandler(handler)
+        _listener.stop()
+        _listener = None
+
+
+def dropped_records() -> int:
+    return _queue_handler.dropped if _queue_handler else 0
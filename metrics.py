@@ -0,0 +1,184 @@
+import asyncio
+import os
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, List, Tuple, TypeVar
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+# Under `uvicorn --workers N` every worker keeps its own metrics. With
+# PROMETHEUS_MULTIPROC_DIR set to an empty directory (wiped before each start),
+# workers write their samples there and /metrics on any worker aggregates all
+# of them; without it, each worker has to be scraped on its own.
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+# How often each worker samples its function-backed gauges in multiprocess mode.
+GAUGE_REFRESH_SECONDS = float(os.getenv("METRICS_GAUGE_REFRESH_SECONDS", "5"))
+
+# Turn stages run from sub-millisecond (cached retrieval) to minutes (follow-up
+# Q&A waits on the user), so the buckets span both.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+PROMPT_CHAR_BUCKETS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000)
+
+# Stage names used by llm_process: assessment, follow_up, chart_matching,
+# similarity, rule_formatting, retrieval_wait (time the prediction still waited
+# on retrieval once the follow-up Q&A was done), prediction (plus chart_precompute
+# in the background).
+STAGE_SECONDS = Histogram(
+    "astro_stage_duration_seconds", "Duration of each stage of a chat turn.", ["stage"], buckets=LATENCY_BUCKETS
+)
+TURN_SECONDS = Histogram(
+    "astro_turn_duration_seconds", "Duration of a whole chat turn (llm_process).", buckets=LATENCY_BUCKETS
+)
+
+# Gemini calls, labelled by call site: assessment, similarity_rerank, prediction.
+LLM_CALL_SECONDS = Histogram(
+    "astro_llm_call_duration_seconds", "Duration of each Gemini call.", ["call", "outcome"], buckets=LATENCY_BUCKETS
+)
+LLM_FIRST_CHUNK_SECONDS = Histogram(
+    "astro_llm_first_chunk_seconds", "Time to the first chunk of a streamed Gemini call.", ["call"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_PROMPT_CHARS = Histogram(
+    "astro_llm_prompt_chars", "Prompt size of each Gemini call, in characters.", ["call"], buckets=PROMPT_CHAR_BUCKETS
+)
+# Gauges are summed over live workers in multiprocess mode.
+LLM_CALLS_IN_FLIGHT = Gauge(
+    "astro_llm_calls_in_flight", "Gemini calls currently running.", ["call"], multiprocess_mode="livesum"
+)
+LLM_CALLS_COALESCED = Counter(
+    "astro_llm_calls_coalesced", "Gemini re-rank calls that shared an identical in-flight call instead of making their own.",
+    ["call"],
+)
+
+ACTIVE_WEBSOCKETS = Gauge("astro_active_websockets", "Open /ws connections.", multiprocess_mode="livesum")
+SESSION_CACHE_RESIDENT = Gauge(
+    "astro_session_cache_resident_sessions", "Sessions held in memory.", multiprocess_mode="livesum"
+)
+SESSION_CACHE_BYTES = Gauge(
+    "astro_session_cache_resident_bytes", "Approximate size of the sessions held in memory.", multiprocess_mode="livesum"
+)
+SESSION_CACHE_EVICTIONS = Counter("astro_session_cache_evictions", "Sessions spilled out of memory.")
+SESSION_CACHE_PINNED = Gauge(
+    "astro_session_cache_pinned_sessions", "Sessions pinned in memory by an open connection.", multiprocess_mode="livesum"
+)
+SESSION_CACHE_MAX_BYTES = Gauge(
+    "astro_session_cache_max_bytes", "Memory budget of the session cache.", multiprocess_mode="livesum"
+)
+# TTLLRUCache statistics, labelled by cache name (e.g. "similarity").
+CACHE_HITS = Counter("astro_cache_hits", "Response cache lookups served from the cache.", ["cache"])
+CACHE_MISSES = Counter("astro_cache_misses", "Response cache lookups not found (or expired).", ["cache"])
+CACHE_EVICTIONS = Counter("astro_cache_evictions", "Response cache entries evicted to stay within size.", ["cache"])
+CACHE_EXPIRATIONS = Counter("astro_cache_expirations", "Response cache entries dropped after their TTL.", ["cache"])
+KB_RELOADS = Counter(
+    "astro_kb_reloads", "Knowledge bank hot reloads, by outcome (swapped, invalid, error).", ["outcome"]
+)
+ASSESSMENTS = Counter(
+    "astro_assessments",
+    "Data-need assessments by route (local, llm_unsure, llm_missing_fields) and classified topic.",
+    ["route", "topic"],
+)
+PROMPT_RULES = Counter(
+    "astro_prompt_rules",
+    "Candidate rules for prediction prompts, by outcome (included, duplicate, over_budget).",
+    ["outcome"],
+)
+LOG_RECORDS_DROPPED = Gauge(
+    "astro_log_records_dropped", "Log records dropped because the log queue was full.", multiprocess_mode="livesum"
+)
+
+T = TypeVar("T")
+
+# (gauge, function) pairs sampled by refresh_gauges() in multiprocess mode.
+_gauge_functions: List[Tuple[Gauge, Callable[[], float]]] = []
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """Records the duration of the enclosed block under `stage`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - start)
+
+
+async def timed_stage(stage: str, awaitable: Awaitable[T]) -> T:
+    """Awaits `awaitable`, recording its duration under `stage`; for stages run via asyncio.gather."""
+    with stage_timer(stage):
+        return await awaitable
+
+
+class LLMCallSpan:
+    """Handle yielded by `llm_call_span`; call `first_chunk()` when a stream produces its first text."""
+
+    def __init__(self, call: str, start: float):
+        self.call = call
+        self.start = start
+        self._first_chunk_seen = False
+
+    def first_chunk(self):
+        if not self._first_chunk_seen:
+            self._first_chunk_seen = True
+            LLM_FIRST_CHUNK_SECONDS.labels(self.call).observe(time.perf_counter() - self.start)
+
+
+@contextmanager
+def llm_call_span(call: str, prompt: str):
+    """
+    Times one Gemini call (outcome "ok" or "error"), records its prompt size,
+    and counts it as in flight while it runs. Safe to use from worker threads.
+    """
+    LLM_PROMPT_CHARS.labels(call).observe(len(prompt))
+    in_flight = LLM_CALLS_IN_FLIGHT.labels(call)
+    in_flight.inc()
+    span = LLMCallSpan(call, time.perf_counter())
+    outcome = "ok"
+    try:
+        yield span
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        in_flight.dec()
+        LLM_CALL_SECONDS.labels(call, outcome).observe(time.perf_counter() - span.start)
+
+
+def track_gauge(gauge: Gauge, func: Callable[[], float]):
+    """
+    Makes `gauge` report `func()`. In a single process it is read at scrape
+    time; in multiprocess mode the scraping worker cannot call other workers'
+    functions, so each worker samples it every GAUGE_REFRESH_SECONDS instead
+    (see `refresh_gauges_periodically`).
+    """
+    if MULTIPROC_DIR:
+        _gauge_functions.append((gauge, func))
+    else:
+        gauge.set_function(func)
+
+
+def refresh_gauges():
+    for gauge, func in _gauge_functions:
+        gauge.set(func())
+
+
+async def refresh_gauges_periodically():
+    while True:
+        refresh_gauges()
+        await asyncio.sleep(GAUGE_REFRESH_SECONDS)
+
+
+def mark_worker_stopped():
+    """Drops this worker's live gauges from the multiprocess aggregate; call on shutdown."""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def render_metrics():
+    """Returns (body, content type) of the Prometheus text exposition, aggregated over workers if configured."""
+    if not MULTIPROC_DIR:
+        return generate_latest(), CONTENT_TYPE_LATEST
+    refresh_gauges()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
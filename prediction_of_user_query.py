@@ -1,8 +1,14 @@
 import google.generativeai as genai
 import os
 import json
+import logging
+import asyncio
 from datetime import datetime
+from typing import AsyncIterator
 import pytz # For IST timezone
+from metrics import llm_call_span
+
+logger = logging.getLogger(__name__)
 
 # --- Configure Gemini API ---
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
@@ -18,31 +24,24 @@ except ImportError:
     import datetime # Need to import datetime again for timezone
     IST = datetime.timezone(datetime.timedelta(hours=5, minutes=30))
 
-def predict_user_query(
+# Fixed replies used when there is nothing to predict from, or Gemini fails.
+NO_RULES_MESSAGE = "प्रियवर, दिए गए नियमों के आधार पर मैं आपकी इस जिज्ञासा के लिए कोई सटीक भविष्यवाणी नहीं दे सकता/सकती हूँ।"
+ERROR_MESSAGE = "मुझे आपकी भविष्यवाणी देने में कुछ समस्या आ रही है। कृपया कुछ देर बाद पुनः प्रयास करें।"
+
+
+class PredictionStreamInterrupted(Exception):
+    """Raised by `predict_user_query_stream` when Gemini fails after part of the prediction was yielded."""
+
+
+def build_prediction_prompt(
     user_data: dict,
     current_time_in_IST: datetime,
     retrieved_rules_text: str,
     user_question: str
 ) -> str:
     """
-    Generates a personalized astrological prediction based on user data,
-    current time, and provided astrological rules, using an LLM.
-
-    The prediction MUST be derived ONLY from the content of retrieved_rules_text.
-
-    Args:
-        user_data (dict): A dictionary containing user's astrological data
-                          (e.g., basic_data, on_demand_data, planets).
-                          Expected to have 'basic_data' (with date_of_birth),
-                          'planets' (with house positions), and 'on_demand_data'.
-        current_time_in_IST (datetime): The current time in IST timezone.
-        retrieved_rules_text (str): A string containing astrological rules
-                                    in "Condition: ...\nResult: ..." format.
-                                    The prediction must be based ONLY on these rules.
-        user_question (str): The original question asked by the user.
-
-    Returns:
-        str: The final astrological prediction in text format.
+    Builds the Gemini prompt for a prediction. Shared by `predict_user_query`
+    and `predict_user_query_stream`; see `predict_user_query` for the arguments.
     """
     
     # Extract relevant user data for the prompt
@@ -120,30 +119,142 @@ Retrieved Astrological Rules (Use ONLY these rules for the prediction):
 
 Based on the above, provide your astrological prediction.
 """
+    return prompt
+
+
+def _has_no_rules(retrieved_rules_text: str) -> bool:
+    return "No matching rules found" in retrieved_rules_text or not retrieved_rules_text.strip()
+
+
+async def predict_user_query(
+    user_data: dict,
+    current_time_in_IST: datetime,
+    retrieved_rules_text: str,
+    user_question: str
+) -> str:
+    """
+    Generates a personalized astrological prediction based on user data,
+    current time, and provided astrological rules, using an LLM. The Gemini
+    call runs in a worker thread so it never blocks the event loop.
+
+    The prediction MUST be derived ONLY from the content of retrieved_rules_text.
+
+    Args:
+        user_data (dict): A dictionary containing user's astrological data
+                          (e.g., basic_data, on_demand_data, planets).
+                          Expected to have 'basic_data' (with date_of_birth),
+                          'planets' (with house positions), and 'on_demand_data'.
+        current_time_in_IST (datetime): The current time in IST timezone.
+        retrieved_rules_text (str): A string containing astrological rules
+                                    in "Condition: ...\nResult: ..." format.
+                                    The prediction must be based ONLY on these rules.
+        user_question (str): The original question asked by the user.
+
+    Returns:
+        str: The final astrological prediction in text format.
+    """
     
-    # Optional: Print prompt for debugging
-    # print("--- Gemini Prediction Prompt ---")
-    # print(prompt)
-    # print("-------------------------------")
+    prompt = build_prediction_prompt(user_data, current_time_in_IST, retrieved_rules_text, user_question)
+
+    # Optional: prompt for debugging (built only when DEBUG is on)
+    logger.debug("Gemini prediction prompt:\n%s", prompt)
 
     try:
         # Call the Gemini model
-        # Using await as `model.generate_content` is now assumed to be async (or wrapped via asyncio.to_thread)
-        response = model.generate_content(prompt)
+        # model.generate_content is synchronous, so run it via asyncio.to_thread
+        with llm_call_span("prediction", prompt):
+            response = await asyncio.to_thread(model.generate_content, prompt)
         prediction_text = response.text.strip()
         
         # Post-process for "No rules" scenario if LLM doesn't follow strictly
         # If the retrieved_rules_text is empty or explicitly says no rules,
         # ensure the prediction also reflects that.
-        if "No matching rules found" in retrieved_rules_text or not retrieved_rules_text.strip():
+        if _has_no_rules(retrieved_rules_text):
             # Check if the LLM's response contains a clear "cannot predict" phrase in English or Hindi
             if not any(phrase in prediction_text.lower() for phrase in ["cannot give a prediction", "no precise prediction", "कोई सटीक भविष्यवाणी नहीं"]):
-                return "प्रियवर, दिए गए नियमों के आधार पर मैं आपकी इस जिज्ञासा के लिए कोई सटीक भविष्यवाणी नहीं दे सकता/सकती हूँ।"
+                return NO_RULES_MESSAGE
         
         return prediction_text
     except Exception as e:
-        print(f"ERROR: Failed to get prediction from Gemini: {e}")
-        return "मुझे आपकी भविष्यवाणी देने में कुछ समस्या आ रही है। कृपया कुछ देर बाद पुनः प्रयास करें।" # Graceful fallback message
+        logger.error("Failed to get prediction from Gemini: %s", e)
+        return ERROR_MESSAGE # Graceful fallback message
+
+
+async def _stream_gemini_text(prompt: str) -> AsyncIterator[str]:
+    """
+    Runs Gemini's streaming generation in a worker thread and yields the text
+    of each chunk on the event loop as soon as it arrives.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    def produce():
+        try:
+            with llm_call_span("prediction", prompt) as span:
+                for chunk in model.generate_content(prompt, stream=True):
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        # Chunk without text parts (e.g. only safety metadata)
+                        continue
+                    if text:
+                        span.first_chunk()
+                        loop.call_soon_threadsafe(queue.put_nowait, text)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    producer = loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        await producer
+
+
+async def predict_user_query_stream(
+    user_data: dict,
+    current_time_in_IST: datetime,
+    retrieved_rules_text: str,
+    user_question: str
+) -> AsyncIterator[str]:
+    """
+    Streaming variant of `predict_user_query`: yields the prediction as
+    partial text chunks while Gemini is still generating it. Concatenating
+    the chunks gives the full prediction.
+
+    When there are no retrieved rules the answer is not streamed; the
+    non-streaming path (with its "no rules" post-processing) is used and its
+    text is yielded as a single chunk. If Gemini fails before producing any
+    text, the usual fallback message is yielded instead.
+
+    Raises:
+        PredictionStreamInterrupted: If Gemini fails after some text was
+            yielded; the chunks so far are an incomplete prediction.
+    """
+    if _has_no_rules(retrieved_rules_text):
+        yield await predict_user_query(user_data, current_time_in_IST, retrieved_rules_text, user_question)
+        return
+
+    prompt = build_prediction_prompt(user_data, current_time_in_IST, retrieved_rules_text, user_question)
+
+    produced_text = False
+    try:
+        async for text in _stream_gemini_text(prompt):
+            produced_text = True
+            yield text
+    except Exception as e:
+        logger.error("Failed to stream prediction from Gemini: %s", e)
+        if produced_text:
+            raise PredictionStreamInterrupted(str(e)) from e
+        yield ERROR_MESSAGE
 
 
 # Example Usage (for testing this file independently)
@@ -155,17 +266,6 @@ if __name__ == "__main__":
     if "GEMINI_API_KEY" not in os.environ:
         os.environ["GEMINI_API_KEY"] = "YOUR_GEMINI_API_KEY" # Replace with a real key for actual LLM calls
 
-    # Ensure the model is correctly initialized as async if run directly
-    # This is a hack for the example to make model.generate_content awaitable.
-    # In your main app, model from `genai.AsyncGenerativeModel` (or `asyncio.to_thread(genai.GenerativeModel)`) is used.
-    _temp_model_instance = genai.GenerativeModel("gemini-2.5-flash-lite-preview-06-17")
-    async def _test_generate_content_wrapper(prompt_text):
-        return await asyncio.to_thread(_temp_model_instance.generate_content, prompt_text)
-    
-    # Temporarily override the module's model.generate_content for testing this file
-    # This is for example execution only, not for production integration.
-    model.generate_content = _test_generate_content_wrapper
-
 
     async def main():
         sample_user_data = {
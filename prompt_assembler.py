@@ -0,0 +1,121 @@
+import logging
+import os
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+from knowledge_bank import get_knowledge_bank
+from metrics import PROMPT_RULES
+from retrieve_astro_chart import get_rendered_rules
+from similarity_engine import cosine_similarity, normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on the estimated tokens spent on rules in one prediction prompt.
+PROMPT_RULES_TOKEN_BUDGET = int(os.getenv("PROMPT_RULES_TOKEN_BUDGET", "2000"))
+# Weights of the two relevance signals in a rule's combined score (both signals are in 0-1).
+CHART_SCORE_WEIGHT = float(os.getenv("PROMPT_CHART_SCORE_WEIGHT", "0.5"))
+QUESTION_SCORE_WEIGHT = float(os.getenv("PROMPT_QUESTION_SCORE_WEIGHT", "0.5"))
+# Rules whose Result texts are at least this similar (n-gram cosine) say the same thing; only the best is kept.
+NEAR_DUPLICATE_SIMILARITY = float(os.getenv("PROMPT_NEAR_DUPLICATE_SIMILARITY", "0.9"))
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimates the Gemini token count of `text` without calling the API.
+
+    Latin text averages about four characters per token; Devanagari tokenizes
+    far less densely, so other characters are counted at two per token. The
+    estimate errs on the high side, which keeps packed prompts under budget.
+    """
+    non_ascii = sum(1 for char in text if ord(char) > 127)
+    return (len(text) - non_ascii + 3) // 4 + (non_ascii + 1) // 2
+
+
+class AssembledRules(NamedTuple):
+    text: str
+    # Excel row numbers of the included rules, highest combined score first.
+    indices: List[int]
+    token_estimate: int
+    duplicates_dropped: int
+    over_budget_dropped: int
+
+    @property
+    def dropped(self) -> int:
+        return self.duplicates_dropped + self.over_budget_dropped
+
+
+def assemble_prompt_rules(
+    user_question: str,
+    chart_scores: Sequence[Tuple[int, int]],
+    question_indices: Sequence[int] = (),
+    token_budget: Optional[int] = None,
+) -> AssembledRules:
+    """
+    Builds the rules section of the prediction prompt within a token budget.
+
+    Every candidate (chart-matched or question-similar) gets a combined score:
+    its chart score relative to the best chart match, plus the cosine between
+    its Result text and the question, weighted by CHART_SCORE_WEIGHT and
+    QUESTION_SCORE_WEIGHT. Candidates are taken best first (ties by Excel row
+    number); a rule whose Result repeats (or nearly repeats) an already kept
+    one is dropped as a duplicate, and a rule that would overflow the budget
+    is skipped in favour of smaller ones further down.
+
+    Args:
+        user_question (str): The user's question.
+        chart_scores: (Excel row number, score) pairs from
+            `rank_matching_rules_by_planet_age_time`.
+        question_indices: Excel row numbers from the question similarity search.
+        token_budget (int | None): Default PROMPT_RULES_TOKEN_BUDGET.
+
+    Returns:
+        AssembledRules: The joined Condition/Result blocks, in the same format
+        as `get_llm_formatted_rules_string`, plus what was dropped.
+    """
+    token_budget = PROMPT_RULES_TOKEN_BUDGET if token_budget is None else token_budget
+    knowledge_bank = get_knowledge_bank()
+    similarity_index = knowledge_bank.similarity_index
+    blocks = get_rendered_rules().blocks
+
+    chart_score_of: Dict[int, int] = dict(chart_scores)
+    candidates = [
+        idx for idx in dict.fromkeys([*chart_score_of, *question_indices])
+        if 0 <= idx < len(blocks) and blocks[idx] is not None
+    ]
+    best_chart_score = max(chart_score_of.values(), default=0) or 1
+    question_vector = similarity_index.vector(user_question)
+
+    result_vectors = {}
+    combined_scores = {}
+    for idx in candidates:
+        result_vectors[idx] = similarity_index.vector(knowledge_bank.get_row(idx)["result"])
+        combined_scores[idx] = (
+            CHART_SCORE_WEIGHT * chart_score_of.get(idx, 0) / best_chart_score
+            + QUESTION_SCORE_WEIGHT * cosine_similarity(question_vector, result_vectors[idx])
+        )
+    candidates.sort(key=lambda idx: (-combined_scores[idx], idx))
+
+    included: List[int] = []
+    seen_results = set()
+    tokens_used = 0
+    duplicates_dropped = over_budget_dropped = 0
+    for idx in candidates:
+        result_key = normalize_text(knowledge_bank.get_row(idx)["result"])
+        if result_key in seen_results or any(
+            cosine_similarity(result_vectors[idx], result_vectors[kept]) >= NEAR_DUPLICATE_SIMILARITY
+            for kept in included
+        ):
+            duplicates_dropped += 1
+            continue
+        # The blank line between blocks is counted with the block.
+        block_tokens = estimate_tokens(blocks[idx]) + 1
+        if tokens_used + block_tokens > token_budget:
+            over_budget_dropped += 1
+            continue
+        seen_results.add(result_key)
+        included.append(idx)
+        tokens_used += block_tokens
+
+    PROMPT_RULES.labels("included").inc(len(included))
+    PROMPT_RULES.labels("duplicate").inc(duplicates_dropped)
+    PROMPT_RULES.labels("over_budget").inc(over_budget_dropped)
+    text = "\n".join(blocks[idx] for idx in included).strip()
+    return AssembledRules(text, included, tokens_used, duplicates_dropped, over_budget_dropped)
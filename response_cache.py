@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+from metrics import CACHE_EVICTIONS, CACHE_EXPIRATIONS, CACHE_HITS, CACHE_MISSES
+
+# Sentinel returned by `get` on a miss, so cached falsy values (e.g. []) still count as hits.
+MISSING = object()
+
+
+class TTLLRUCache:
+    """
+    Thread-safe, size-bounded cache with LRU eviction and a per-entry TTL.
+
+    Keeps hit / miss / eviction / expiration counters so cache effectiveness
+    can be reported (see `stats`); they are also exported on /metrics,
+    labelled with the cache's `name`.
+    """
+
+    def __init__(self, maxsize: int, ttl_seconds: float, name: str):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.name = name
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._hit_counter = CACHE_HITS.labels(name)
+        self._miss_counter = CACHE_MISSES.labels(name)
+        self._eviction_counter = CACHE_EVICTIONS.labels(name)
+        self._expiration_counter = CACHE_EXPIRATIONS.labels(name)
+
+    def get(self, key: Hashable) -> Any:
+        """Returns the cached value for `key`, or MISSING if absent or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    self._hit_counter.inc()
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+                self._expiration_counter.inc()
+            self.misses += 1
+            self._miss_counter.inc()
+            return MISSING
+
+    def set(self, key: Hashable, value: Any):
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+                self._eviction_counter.inc()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else None,
+        }
@@ -1,8 +1,11 @@
-import pandas as pd
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+import logging
 import re
+import threading
+from typing import Dict, List, Optional
+from knowledge_bank import KnowledgeBank, get_knowledge_bank, today_in_ist
 
-EXCEL_FILE = "Refined_Knowledge_Bank (1).xlsx"
+logger = logging.getLogger(__name__)
 
 # Mapping from short planet names (as found in Excel 'Condition')
 # to their full, more readable names.
@@ -18,6 +21,16 @@ SHORT_TO_FULL_PLANET_NAME_MAP = {
     "ketu": "Ketu"
 }
 
+# Compiled once; these run over every rule during the daily pre-render.
+TIME_PATTERN = re.compile(r'TIME\s*\(\((.*?)(?:\)\))?\s*$', re.IGNORECASE | re.DOTALL)
+SHORT_PLANET_NAME_PATTERNS = [
+    (re.compile(r'\b' + re.escape(short) + r'\b', re.IGNORECASE), full)
+    for short, full in SHORT_TO_FULL_PLANET_NAME_MAP.items()
+]
+NATAL_PATTERN = re.compile(r'Natal\s*\(([^)]+)\)', re.IGNORECASE)
+AND_PATTERN = re.compile(r'\s+AND\s+', re.IGNORECASE)
+OR_PATTERN = re.compile(r'\s+OR\s+', re.IGNORECASE)
+
 def calculate_dob_range_from_time_period(current_date: datetime, start_date_obj: datetime, end_date_obj: datetime) -> str:
     """
     Calculates the approximate Date of Birth range for a person for whom the
@@ -35,21 +48,23 @@ def calculate_dob_range_from_time_period(current_date: datetime, start_date_obj:
     return f"{start_dob_approx.strftime('%Y-%m-%d')} to {end_dob_approx.strftime('%Y-%m-%d')}"
 
 
-def transform_condition_to_dob_and_full_planets(original_condition_string: str) -> str:
+def transform_condition_to_dob_and_full_planets(original_condition_string: str, current_day: Optional[date] = None) -> str:
     """
     Transforms the original condition string by:
     1. Converting 'TIME ((...))' to 'DOB (...)' ranges.
     2. Replacing short planet names with full names.
     3. Cleaning up 'Natal()' wrappers.
     4. General whitespace cleanup.
+
+    The DOB ranges are relative to `current_day` (default: today in IST).
     """
-    current_date = datetime.now() 
+    # Same IST calendar day the chart matcher uses (midnight, as a datetime for the DOB math).
+    current_date = datetime.combine(current_day or today_in_ist(), datetime.min.time())
 
     modified_condition = original_condition_string
 
     # --- Step 1: Convert TIME to DOB ---
-    time_pattern = re.compile(r'TIME\s*\(\((.*?)(?:\)\))?\s*$', re.IGNORECASE | re.DOTALL)
-    match = time_pattern.search(modified_condition)
+    match = TIME_PATTERN.search(modified_condition)
 
     if match:
         all_time_ranges_str = match.group(1).strip()
@@ -94,27 +109,89 @@ def transform_condition_to_dob_and_full_planets(original_condition_string: str)
         if converted_dob_ranges_list:
             new_dob_condition_content = ", ".join(converted_dob_ranges_list)
             new_dob_condition_str = f"DOB ({new_dob_condition_content})"
-            modified_condition = time_pattern.sub(new_dob_condition_str, modified_condition, count=1)
+            modified_condition = TIME_PATTERN.sub(new_dob_condition_str, modified_condition, count=1)
     
     # --- Step 2: Expand short planet names to full names ---
-    for short, full in SHORT_TO_FULL_PLANET_NAME_MAP.items():
-        modified_condition = re.sub(r'\b' + re.escape(short) + r'\b', full, modified_condition, flags=re.IGNORECASE)
+    for pattern, full in SHORT_PLANET_NAME_PATTERNS:
+        modified_condition = pattern.sub(full, modified_condition)
 
     # --- Step 3: Remove Natal() wrappers ---
-    modified_condition = re.sub(r'Natal\s*\(([^)]+)\)', r'\1', modified_condition, flags=re.IGNORECASE)
+    modified_condition = NATAL_PATTERN.sub(r'\1', modified_condition)
 
     # --- Step 4: General whitespace and operator cleanup ---
-    modified_condition = re.sub(r'\s+AND\s+', ' AND ', modified_condition, flags=re.IGNORECASE)
-    modified_condition = re.sub(r'\s+OR\s+', ' OR ', modified_condition, flags=re.IGNORECASE)
+    modified_condition = AND_PATTERN.sub(' AND ', modified_condition)
+    modified_condition = OR_PATTERN.sub(' OR ', modified_condition)
     modified_condition = modified_condition.strip() 
 
     return modified_condition
 
 
+class RenderedRules:
+    """
+    Every rule's final "Condition/Result" block for one IST day, in a list
+    indexed by Excel row number (rows that do not exist are None).
+
+    The blocks only depend on the rule and the date, so they are rendered once
+    per day and knowledge bank version instead of once per question.
+    """
+
+    def __init__(self, content_hash: str, day: date, blocks: List[Optional[str]]):
+        self.content_hash = content_hash
+        self.day = day
+        self.blocks = blocks
+
+
+def render_rule_blocks(knowledge_bank: KnowledgeBank, day: Optional[date] = None) -> RenderedRules:
+    """Renders the LLM block of every rule in `knowledge_bank` for `day` (default: today in IST)."""
+    day = day or today_in_ist()
+    row_numbers = knowledge_bank.row_numbers()
+    blocks: List[Optional[str]] = [None] * (max(row_numbers, default=0) + 1)
+    for row_idx in row_numbers:
+        row = knowledge_bank.get_row(row_idx)
+        transformed_condition = transform_condition_to_dob_and_full_planets(row["condition"], day)
+        blocks[row_idx] = f"Condition: {transformed_condition}\nResult: {row['result']}\n"
+    return RenderedRules(knowledge_bank.content_hash, day, blocks)
+
+
+# Latest render per knowledge bank version. Two slots, so requests still pinned
+# to the previous version during a hot reload do not evict the new one.
+_rendered_rules: Dict[str, RenderedRules] = {}
+_RENDERED_VERSIONS_KEPT = 2
+_render_lock = threading.Lock()
+
+
+def get_rendered_rules() -> RenderedRules:
+    """
+    Returns today's pre-rendered rule blocks for the current (or pinned)
+    knowledge bank, re-rendering when the IST date has changed since the last
+    render or the version has not been rendered yet.
+    """
+    # Resolved once: a hot reload swapping the bank mid-render must not mix versions.
+    knowledge_bank = get_knowledge_bank()
+    content_hash = knowledge_bank.content_hash
+    day = today_in_ist()
+    rendered = _rendered_rules.get(content_hash)
+    if rendered is not None and rendered.day == day:
+        return rendered
+    with _render_lock:
+        # Another thread may have rendered while we waited for the lock.
+        rendered = _rendered_rules.get(content_hash)
+        if rendered is None or rendered.day != day:
+            rendered = render_rule_blocks(knowledge_bank, day)
+            _rendered_rules.pop(rendered.content_hash, None)
+            _rendered_rules[rendered.content_hash] = rendered
+            while len(_rendered_rules) > _RENDERED_VERSIONS_KEPT:
+                del _rendered_rules[next(iter(_rendered_rules))]
+            logger.info("Pre-rendered %d rules for %s.", len(knowledge_bank), day.isoformat())
+        return rendered
+
+
 def get_llm_formatted_rules_string(excel_rows_indices: list) -> str:
     """
-    Processes specified Excel rows, applies the transformation to each,
-    and consolidates the results into a single string formatted for an LLM.
+    Consolidates the specified Excel rows into a single string formatted for an LLM.
+
+    Each row's transformed Condition-Result block is taken from the daily
+    pre-render (see `get_rendered_rules`), so this is just a join.
 
     Args:
         excel_rows_indices (list): A list of Excel row numbers (1-indexed) to process.
@@ -123,27 +200,15 @@ def get_llm_formatted_rules_string(excel_rows_indices: list) -> str:
         str: A single string containing all transformed Condition-Result pairs.
              Returns an empty string if no valid rows are processed.
     """
-    excel_df = pd.read_excel(EXCEL_FILE)
-    
+    blocks = get_rendered_rules().blocks
+
     llm_output_parts = []
 
     for row_idx in excel_rows_indices:
-        df_row_index = row_idx - 2 # Adjust for 0-indexed DataFrame
-
-        if df_row_index < 0 or df_row_index >= len(excel_df):
-            # Skip invalid row indices
-            # print(f"Warning: Row {row_idx} is out of bounds and will be skipped.")
-            continue
+        # Skip invalid row indices
+        if 0 <= row_idx < len(blocks) and blocks[row_idx] is not None:
+            llm_output_parts.append(blocks[row_idx])
 
-        original_condition = str(excel_df.iloc[df_row_index]['Condition'])
-        result = str(excel_df.iloc[df_row_index]['Result'])
-        
-        # Apply the full transformation
-        transformed_condition = transform_condition_to_dob_and_full_planets(original_condition)
-
-        # Format for LLM input
-        llm_output_parts.append(f"Condition: {transformed_condition}\nResult: {result}\n")
-        
     return "\n".join(llm_output_parts).strip() # Join with newlines and remove any trailing whitespace
 
 
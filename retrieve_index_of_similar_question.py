@@ -1,40 +1,114 @@
-import pandas as pd
 import google.generativeai as genai
+import logging
 import os
 import re # <--- ADDED THIS LINE
+from knowledge_bank import get_knowledge_bank
+from metrics import llm_call_span
+from response_cache import MISSING, TTLLRUCache
+from similarity_engine import normalize_text
+from single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
 
 # Configure Gemini API (ensure GEMINI_API_KEY is set in your environment variables)
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 model = genai.GenerativeModel("gemini-2.5-flash-lite-preview-06-17")
 
-EXCEL_FILE = "Refined_Knowledge_Bank (1).xlsx"
-
-def get_relevant_excel_indices(user_query: str) -> list[int]:
+# Number of rows returned by the local retrieval engine, and the minimum cosine
+# score a Result text needs to count as relevant at all.
+DEFAULT_TOP_K = 10
+MIN_SIMILARITY_SCORE = 0.25
+
+# Gemini is only an optional re-ranker over the local top-k candidates.
+# Enable it with SIMILARITY_LLM_RERANK=1.
+USE_LLM_RERANK = os.getenv("SIMILARITY_LLM_RERANK", "0") == "1"
+
+# Cache in front of the retrieval: keyed on the normalized query plus the
+# knowledge bank's content hash, so an edited sheet never serves stale rows.
+SIMILARITY_CACHE_SIZE = int(os.getenv("SIMILARITY_CACHE_SIZE", "4096"))
+SIMILARITY_CACHE_TTL_SECONDS = float(os.getenv("SIMILARITY_CACHE_TTL_SECONDS", "21600"))
+similarity_cache = TTLLRUCache(SIMILARITY_CACHE_SIZE, SIMILARITY_CACHE_TTL_SECONDS, "similarity")
+
+# Identical questions arriving together (e.g. right after a push notification)
+# miss the cache together; they share one re-rank call instead of one each.
+rerank_flight = SingleFlight("similarity_rerank")
+
+def get_relevant_excel_indices(
+    user_query: str,
+    top_k: int = DEFAULT_TOP_K,
+    use_llm_rerank: bool = USE_LLM_RERANK
+) -> list[int]:
     """
-    Queries a Gemini model to find the most relevant Excel row indices
-    based on a user query and the 'Result' column of an Excel file.
+    Finds the Excel row indices whose 'Result' text is most relevant to the
+    user query, using the local character n-gram TF-IDF index built when the
+    knowledge bank was loaded (English / Hinglish queries are normalized to
+    Devanagari first). Optionally lets Gemini re-rank the local candidates.
+
+    Results are cached per (normalized query, knowledge bank hash, top_k,
+    re-rank flag); see `similarity_cache` for the LRU/TTL settings and
+    hit/miss counters.
 
     Args:
         user_query (str): The user's question or query.
+        top_k (int): Maximum number of rows to return.
+        use_llm_rerank (bool): Ask Gemini to re-rank the local top-k candidates.
 
     Returns:
-        list[int]: A list of integer Excel row numbers (1-indexed)
-                   that Gemini deems most relevant. Returns an empty list
-                   if no numbers are found or an error occurs.
+        list[int]: A list of integer Excel row numbers (1-indexed), most
+                   relevant first. Returns an empty list if nothing is
+                   relevant or an error occurs.
     """
     try:
-        excel_df = pd.read_excel(EXCEL_FILE)
-    except FileNotFoundError:
-        print(f"Error: Excel file not found at '{EXCEL_FILE}'.")
+        knowledge_bank = get_knowledge_bank()
+    except FileNotFoundError as e:
+        logger.error("Excel file not found: %s", e)
         return []
     except Exception as e:
-        print(f"Error loading Excel file: {e}")
+        logger.error("Error loading Excel file: %s", e)
         return []
 
-    # Prepare results block for LLM (using 1-based Excel indexing)
+    cache_key = (knowledge_bank.content_hash, normalize_text(user_query), top_k, use_llm_rerank)
+    cached_indices = similarity_cache.get(cache_key)
+    if cached_indices is not MISSING:
+        return list(cached_indices)
+
+    candidate_indices = [
+        idx for idx, _ in knowledge_bank.similarity_index.search(user_query, top_k, MIN_SIMILARITY_SCORE)
+    ]
+
+    cacheable = True
+    if use_llm_rerank and candidate_indices:
+        # A failed re-rank falls back to the local ranking for this call only; it is
+        # not cached, so the next identical question asks Gemini again.
+        candidate_indices, cacheable = rerank_indices_with_gemini(user_query, candidate_indices)
+
+    if cacheable:
+        similarity_cache.set(cache_key, tuple(candidate_indices))
+    return candidate_indices
+
+def _generate_rerank(prompt: str):
+    with llm_call_span("similarity_rerank", prompt):
+        return model.generate_content(prompt)
+
+def rerank_indices_with_gemini(user_query: str, candidate_indices: list[int]) -> tuple[list[int], bool]:
+    """
+    Asks Gemini to pick and order the most relevant rows among the local candidates.
+
+    Args:
+        user_query (str): The user's question or query.
+        candidate_indices (list[int]): Excel row numbers from the local engine.
+
+    Returns:
+        tuple: (rows, succeeded). On success, the rows Gemini selected in its
+               order. If the call fails or the reply names none of the
+               candidates, the local ranking and False.
+    """
+    knowledge_bank = get_knowledge_bank()
+
+    # Prepare results block for LLM (using 1-based Excel indexing), candidates only
     hard_code_result_block = ""
-    for idx, row in enumerate(excel_df.itertuples(index=False), start=2): # Start from 2 for Excel row numbers
-        result = str(row.Result).strip()
+    for idx in candidate_indices:
+        result = knowledge_bank.get_row(idx)["result"].strip()
         if result:
             hard_code_result_block += f"{idx}. {result}\n"
 
@@ -53,20 +127,11 @@ And the following list of texts, prefixed with their line numbers:
 Return the most relevant line numbers (e.g., 2, 3, 47) that most closely match the user's question in meaning.
 Only return a list of numbers comma separated. Do not return explanations.
 """
-    # Optional: Print prompt for debugging
-    # print("--- Gemini Prompt ---")
-    # print(prompt)
-    # print("---------------------")
 
     try:
         # Get Gemini response
-        response = model.generate_content(prompt)
+        response = rerank_flight.do(prompt, _generate_rerank, prompt)
         gemini_text_response = response.text
-        
-        # Optional: Print Gemini's raw response
-        # print("--- Gemini Raw Response ---")
-        # print(gemini_text_response)
-        # print("---------------------------")
 
         # Extract line numbers from Gemini's response
         # This regex handles comma-separated numbers, spaces, and potential newlines.
@@ -74,20 +139,19 @@ Only return a list of numbers comma separated. Do not return explanations.
         
         matched_indexes = []
         for num_str in matched_numbers_str:
-            try:
-                idx = int(num_str)
-                # Basic validation: ensure index is within reasonable Excel row bounds
-                if 2 <= idx <= len(excel_df) + 1:
-                    matched_indexes.append(idx)
-            except ValueError:
-                # Should not happen with \b\d+\b but good practice
-                continue
+            idx = int(num_str)
+            # Only accept rows that were actually offered as candidates
+            if idx in candidate_indices and idx not in matched_indexes:
+                matched_indexes.append(idx)
         
-        return matched_indexes
+        if not matched_indexes:
+            logger.warning("Gemini re-rank reply named none of the candidates: %r. Using local ranking.", gemini_text_response)
+            return candidate_indices, False
+        return matched_indexes, True
 
     except Exception as e:
-        print(f"Error getting or processing Gemini response: {e}")
-        return []
+        logger.warning("Error getting or processing Gemini response: %s. Using local ranking.", e)
+        return candidate_indices, False
 
 # Example Usage:
 if __name__ == "__main__":
@@ -99,20 +163,19 @@ if __name__ == "__main__":
     relevant_indices = get_relevant_excel_indices(user_question)
 
     
-    print(f"\nRelevant Excel Row Indices (from Gemini): {relevant_indices}")
+    print(f"\nRelevant Excel Row Indices (local engine): {relevant_indices}")
 
     # You can then use these indices to fetch full rule details if needed
     if relevant_indices:
         try:
-            excel_df_full = pd.read_excel(EXCEL_FILE)
+            knowledge_bank = get_knowledge_bank()
             print("\n--- Details of Top Relevant Rule ---")
             # Get the first relevant rule's details
             first_relevant_idx = relevant_indices[0]
-            # Convert 1-based Excel row index to 0-based DataFrame index
-            df_row_idx = first_relevant_idx - 2 
-            if 0 <= df_row_idx < len(excel_df_full):
-                rule_condition = str(excel_df_full.iloc[df_row_idx]["Condition"]).strip()
-                rule_result = str(excel_df_full.iloc[df_row_idx]["Result"]).strip()
+            row = knowledge_bank.get_row(first_relevant_idx)
+            if row is not None:
+                rule_condition = row["condition"].strip()
+                rule_result = row["result"].strip()
                 print(f"Excel Row: {first_relevant_idx}")
                 print(f"  Condition: {rule_condition}")
                 print(f"  Result: {rule_result}")
@@ -121,4 +184,4 @@ if __name__ == "__main__":
         except Exception as e:
             print(f"Error fetching rule details from Excel: {e}")
     else:
-        print("\nNo relevant rules found by Gemini.")
\ No newline at end of file
+        print("\nNo relevant rules found.")
\ No newline at end of file
@@ -1,9 +1,10 @@
-import pandas as pd
 from datetime import datetime
-import re
+import logging
+from typing import List, Optional, Tuple
 import random
+from knowledge_bank import get_knowledge_bank, today_in_ist
 
-EXCEL_FILE = "Refined_Knowledge_Bank (1).xlsx"
+logger = logging.getLogger(__name__)
 
 # Mapping from full planet names (as expected in user_planet_positions)
 # to their short forms used in the Excel sheet's 'Condition' column.
@@ -19,36 +20,104 @@ PLANET_NAME_MAP = {
     "Ketu": "ketu"
 }
 
+# Default number of chart-matched rules returned by the ranked (all-planet) mode.
+DEFAULT_TOP_K_RULES = 15
+
 def calculate_age(dob_str: str) -> int:
     """Calculates age based on DOB string and current IST date."""
-    today = datetime.now()
+    today = today_in_ist()
     dob = datetime.strptime(dob_str, "%Y-%m-%d")
     age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
     return age
 
-def get_matching_rules_by_planet_age_time(user_dob: str, user_planet_positions: dict) -> list:
+def _to_chart_positions(user_planet_positions: dict) -> dict:
+    """Re-keys the user's chart by the short planet names used in the compiled predicates."""
+    return {
+        PLANET_NAME_MAP[name]: int(house)
+        for name, house in user_planet_positions.items()
+        if name in PLANET_NAME_MAP
+    }
+
+def rank_matching_rules_by_planet_age_time(user_dob: str, user_planet_positions: dict) -> List[Tuple[int, int]]:
+    """
+    Evaluates every planet of the chart in one pass and scores the matching rules.
+
+    A rule matches when at least one of its natal predicates holds for the chart
+    and its AGE / TIME clauses (if any) hold today. Its score is the number of
+    satisfied predicates, AGE and TIME included. The ranking is deterministic:
+    score descending, then Excel row number ascending.
+
+    Args:
+        user_dob (str): The user's Date of Birth in "YYYY-MM-DD" format.
+        user_planet_positions (dict): A dictionary of user's natal planet positions
+                                      e.g., {"Sun": 7, "Moon": 7, ...}.
+
+    Returns:
+        list: (Excel row number, score) tuples, best match first.
+    """
+    knowledge_bank = get_knowledge_bank()
+    current_age = calculate_age(user_dob)
+    chart_positions = _to_chart_positions(user_planet_positions)
+
+    candidate_indices = set()
+    for planet in chart_positions:
+        candidate_indices.update(knowledge_bank.planet_index.candidates_for_planet(planet, chart_positions))
+    # TIME filtering is a single (per-day cached) interval-index lookup.
+    candidate_indices &= knowledge_bank.time_index.active_on(today_in_ist())
+
+    scored_rules = []
+    for idx in candidate_indices:
+        compiled = knowledge_bank.compiled[idx]
+        if not compiled.age_matches(current_age):
+            continue
+        score = compiled.count_natal_matches(chart_positions)
+        score += compiled.ages is not None
+        score += compiled.time_windows is not None
+        scored_rules.append((idx, score))
+
+    scored_rules.sort(key=lambda item: (-item[1], item[0]))
+    return scored_rules
+
+def get_matching_rules_by_planet_age_time(
+    user_dob: str,
+    user_planet_positions: dict,
+    all_planets: bool = False,
+    top_k: Optional[int] = DEFAULT_TOP_K_RULES
+) -> list:
     """
     Finds Excel rows where the 'Condition' matches a randomly selected
     user planet's natal house position, along with age and time period.
 
+    With `all_planets=True` every planet is evaluated instead of one random
+    planet, and the `top_k` best-scoring rows are returned in a stable order
+    (see `rank_matching_rules_by_planet_age_time`), so the same chart on the
+    same date always yields the same indices.
+
     Args:
         user_dob (str): The user's Date of Birth in "YYYY-MM-DD" format.
         user_planet_positions (dict): A dictionary of user's natal planet positions
                                       e.g., {"Sun": 7, "Moon": 7, ...}.
+        all_planets (bool): Use the deterministic, ranked all-planet mode.
+        top_k (int | None): Maximum rows returned in all-planet mode (None = no cap).
 
     Returns:
         list: A list of integer Excel row numbers (indices) that match the criteria.
               Returns an empty list if no matches.
     """
-    excel_df = pd.read_excel(EXCEL_FILE)
+    if all_planets:
+        ranked_rules = rank_matching_rules_by_planet_age_time(user_dob, user_planet_positions)
+        if top_k is not None:
+            ranked_rules = ranked_rules[:top_k]
+        return [idx for idx, _ in ranked_rules]
+
+    knowledge_bank = get_knowledge_bank()
     current_age = calculate_age(user_dob)
-    current_date = datetime.now() 
 
     # --- CRITICAL CHANGE: Initialize as a list of integers ---
     matched_excel_indices = [] 
 
     if not user_planet_positions:
-        print("Error: user_planet_positions dictionary is empty. Cannot select a random planet.")
+        logger.error("user_planet_positions dictionary is empty. Cannot select a random planet.")
         return []
 
     # Pick one random planet and its house from the user's data
@@ -67,117 +136,30 @@ def get_matching_rules_by_planet_age_time(user_dob: str, user_planet_positions:
             break
     
     if mapped_random_planet_name is None:
-        print("Error: No mappable planets found in user_planet_positions. Please ensure keys match PLANET_NAME_MAP.")
+        logger.error("No mappable planets found in user_planet_positions. Please ensure keys match PLANET_NAME_MAP.")
         return []
 
-    print(f"Debug: Randomly selected planet for matching: {mapped_random_planet_name.capitalize()} (full: {planet_full_name}) in house {random_planet_house}")
+    logger.debug("Randomly selected planet for matching: %s (full: %s) in house %s", mapped_random_planet_name.capitalize(), planet_full_name, random_planet_house)
+
+    chart_positions = _to_chart_positions(user_planet_positions)
+
+    # Only rules indexed under the selected planet's natal predicates are candidates;
+    # sort them so results keep the sheet order.
+    candidate_indices = knowledge_bank.planet_index.candidates_for_planet(mapped_random_planet_name, chart_positions)
+    active_indices = knowledge_bank.time_index.active_on(today_in_ist())
 
-    for idx, row in enumerate(excel_df.itertuples(index=False), start=2):
-        condition = str(row.Condition).lower()
-        
+    for idx in sorted(candidate_indices):
+        compiled = knowledge_bank.compiled[idx]
         # --- Condition 1: Natal Planet Position Matching ---
-        natal_match = False 
-        
-        # 1.1 Check for specific "random_planet in its_house" match
-        # Using \b for word boundaries to ensure 'sat' doesn't match 'saturday'
-        # and checking for 'in' followed by the exact house number.
-        natal_planet_in_house_pattern = re.compile(
-            rf'\b{mapped_random_planet_name}\s+in\s+{random_planet_house}\b'
-        )
-        
-        if natal_planet_in_house_pattern.search(condition):
-            natal_match = True
-        
-        # 1.2 Check for "random_planet conjunct other_planet" or "other_planet conjunct random_planet"
-        # and verify their positions
-        conjunct_pattern = re.compile(
-            rf'\b({mapped_random_planet_name})\s+conjunct\s+([a-z]+)\b|\b([a-z]+)\s+conjunct\s+({mapped_random_planet_name})\b'
-        )
-        
-        conjunct_matches = conjunct_pattern.findall(condition)
-        for match_group in conjunct_matches:
-            # findall returns tuples, determine which group is the "other planet"
-            matched_planet_short_name_in_rule = ''
-            if match_group[0] == mapped_random_planet_name: # random planet is first
-                matched_planet_short_name_in_rule = match_group[1]
-            elif match_group[3] == mapped_random_planet_name: # random planet is second
-                matched_planet_short_name_in_rule = match_group[2]
-
-            # Find the full name for the "other_planet" from the map (reverse lookup)
-            other_planet_full_name = None
-            for full_name, short_name in PLANET_NAME_MAP.items():
-                if short_name == matched_planet_short_name_in_rule:
-                    other_planet_full_name = full_name
-                    break
-
-            if (other_planet_full_name and # ensure we found a valid other planet
-                planet_full_name in user_planet_positions and # ensure random planet is in user data
-                other_planet_full_name in user_planet_positions and # ensure other planet is in user data
-                user_planet_positions[planet_full_name] == user_planet_positions[other_planet_full_name]): # positions match
-                natal_match = True
-                break # If one conjunction involving the random planet matches, this part is met
-            
-        # 1.3 Check for "random_planet not-with other_planet"
-        not_with_pattern = re.compile(
-            rf'\b({mapped_random_planet_name})\s+not-with\s+([a-z]+)\b|\b([a-z]+)\s+not-with\s+({mapped_random_planet_name})\b'
-        )
-
-        not_with_matches = not_with_pattern.findall(condition)
-        for match_group in not_with_matches:
-            matched_planet_short_name_in_rule = ''
-            if match_group[0] == mapped_random_planet_name:
-                matched_planet_short_name_in_rule = match_group[1]
-            elif match_group[3] == mapped_random_planet_name:
-                matched_planet_short_name_in_rule = match_group[2]
-
-            other_planet_full_name = None
-            for full_name, short_name in PLANET_NAME_MAP.items():
-                if short_name == matched_planet_short_name_in_rule:
-                    other_planet_full_name = full_name
-                    break
-            
-            if (other_planet_full_name and
-                planet_full_name in user_planet_positions and
-                other_planet_full_name in user_planet_positions and
-                user_planet_positions[planet_full_name] != user_planet_positions[other_planet_full_name]):
-                natal_match = True # This specific 'not-with' condition is met
-                break
-
-        if not natal_match:
-            continue 
-            
+        # (already satisfied: the index only returns rules whose planet-in-house,
+        # conjunct or not-with predicate holds for the selected planet)
+
         # --- Condition 2: Age Matching ---
-        age_condition_met = True
-        age_pattern = re.search(r'age\s*\(([^)]+)\)', condition)
-        if age_pattern:
-            ages_in_rule = [int(a.strip()) for a in age_pattern.group(1).split('/')]
-            if current_age not in ages_in_rule:
-                age_condition_met = False
-        
-        if not age_condition_met:
+        if not compiled.age_matches(current_age):
             continue
 
         # --- Condition 3: Time Period (Dasha) Matching ---
-        time_condition_met = True
-        time_pattern = re.search(r'time\s*\(\(([^)]+)\)\)', condition)
-        if time_pattern:
-            time_ranges_str = time_pattern.group(1).split('), (')
-            
-            any_time_range_matches = False
-            for tr_str in time_ranges_str:
-                try:
-                    start_date_str, end_date_str = tr_str.replace('(', '').replace(')', '').split(' to ')
-                    start_date = datetime.strptime(start_date_str.strip(), "%Y-%m-%d")
-                    end_date = datetime.strptime(end_date_str.strip(), "%Y-%m-%d")
-                    if start_date <= current_date <= end_date:
-                        any_time_range_matches = True
-                        break
-                except ValueError:
-                    continue 
-            if not any_time_range_matches:
-                time_condition_met = False
-        
-        if not time_condition_met:
+        if idx not in active_indices:
             continue
 
         # If all three conditions are met for this rule
@@ -209,6 +191,9 @@ if __name__ == "__main__":
     matched_rules_indices = get_matching_rules_by_planet_age_time(user_dob_input, user_birth_chart_data)
 
     print("matched rules indices:", matched_rules_indices)
+
+    ranked_rules_indices = get_matching_rules_by_planet_age_time(user_dob_input, user_birth_chart_data, all_planets=True)
+    print("ranked rules indices (all planets):", ranked_rules_indices)
     
     print(f"\n--- Matched Rule Indices ({len(matched_rules_indices)} found) ---")
     if matched_rules_indices:
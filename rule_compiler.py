@@ -0,0 +1,175 @@
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Dict, FrozenSet, Optional, Tuple
+import re
+
+# Short planet names as they appear in the Excel 'Condition' column.
+SHORT_PLANET_NAMES = ("sun", "moon", "mars", "mer", "jup", "ven", "sat", "rahu", "ketu")
+
+# Pre-compiled grammar for the 'Condition' column (applied to the lowercased string).
+PLANET_IN_HOUSE_PATTERN = re.compile(r'\b([a-z]+)\s+in\s+(\d+(?:\s*/\s*\d+)*)\b')
+CONJUNCT_PATTERN = re.compile(r'\b([a-z]+)\s+conjunct\s+([a-z]+)\b')
+NOT_WITH_PATTERN = re.compile(r'\b([a-z]+)\s+not-with\s+([a-z]+)\b')
+AGE_PATTERN = re.compile(r'\bage\s*\(([^)]*)\)')
+TIME_CLAUSE_PATTERN = re.compile(r'\btime\s*\((.*)$', re.DOTALL)
+# A single "(start to end)" window. The sheet truncates some long TIME clauses,
+# so the end date may be missing or cut down to just a year.
+TIME_WINDOW_PATTERN = re.compile(r'(\d{4}-\d{2}-\d{2})\s+to\s*(\d{4}(?:-\d{2}-\d{2})?)?')
+
+
+@dataclass(frozen=True)
+class PlanetInHouse:
+    """'<planet> in <h1>/<h2>/...' -- the planet sits in any of the listed houses."""
+    planet: str
+    houses: FrozenSet[int]
+
+
+@dataclass(frozen=True)
+class Conjunction:
+    """'<planet> conjunct <other>' -- both planets sit in the same house."""
+    planet: str
+    other: str
+
+
+@dataclass(frozen=True)
+class NotWith:
+    """'<planet> not-with <other>' -- the two planets sit in different houses."""
+    planet: str
+    other: str
+
+
+@dataclass(frozen=True)
+class CompiledCondition:
+    """
+    Structured form of one rule's 'Condition' string.
+
+    `ages` and `time_windows` are None when the rule has no AGE / TIME clause,
+    i.e. when that part of the condition is always satisfied.
+    """
+    in_house: Tuple[PlanetInHouse, ...]
+    conjunctions: Tuple[Conjunction, ...]
+    not_with: Tuple[NotWith, ...]
+    ages: Optional[FrozenSet[int]]
+    time_windows: Optional[Tuple[Tuple[date, date], ...]]
+
+    def planets(self) -> FrozenSet[str]:
+        """Returns every planet mentioned by the natal predicates."""
+        names = {p.planet for p in self.in_house}
+        for pair in self.conjunctions + self.not_with:
+            names.update((pair.planet, pair.other))
+        return frozenset(names)
+
+    def natal_match_for_planet(self, planet: str, positions: Dict[str, int]) -> bool:
+        """
+        Checks whether any natal predicate involving `planet` holds for the chart.
+
+        Args:
+            planet (str): Short planet name (e.g. "sat").
+            positions (dict): Chart keyed by short planet name, e.g. {"sat": 11, ...}.
+        """
+        house = positions.get(planet)
+        for predicate in self.in_house:
+            if predicate.planet == planet and house in predicate.houses:
+                return True
+        for predicate in self.conjunctions:
+            if planet in (predicate.planet, predicate.other):
+                if _positions_known(predicate, positions) and positions[predicate.planet] == positions[predicate.other]:
+                    return True
+        for predicate in self.not_with:
+            if planet in (predicate.planet, predicate.other):
+                if _positions_known(predicate, positions) and positions[predicate.planet] != positions[predicate.other]:
+                    return True
+        return False
+
+    def count_natal_matches(self, positions: Dict[str, int]) -> int:
+        """Counts how many natal predicates (for any planet) hold for the chart."""
+        count = 0
+        for predicate in self.in_house:
+            if positions.get(predicate.planet) in predicate.houses:
+                count += 1
+        for predicate in self.conjunctions:
+            if _positions_known(predicate, positions) and positions[predicate.planet] == positions[predicate.other]:
+                count += 1
+        for predicate in self.not_with:
+            if _positions_known(predicate, positions) and positions[predicate.planet] != positions[predicate.other]:
+                count += 1
+        return count
+
+    def age_matches(self, age: int) -> bool:
+        return self.ages is None or age in self.ages
+
+    def is_active_on(self, day: date) -> bool:
+        if self.time_windows is None:
+            return True
+        return any(start <= day <= end for start, end in self.time_windows)
+
+
+def _positions_known(predicate, positions: Dict[str, int]) -> bool:
+    return predicate.planet in positions and predicate.other in positions
+
+
+def _check_planet(name: str) -> str:
+    if name not in SHORT_PLANET_NAMES:
+        raise ValueError(f"Unknown planet '{name}'")
+    return name
+
+
+def _parse_time_windows(time_clause: str) -> Tuple[Tuple[date, date], ...]:
+    windows = []
+    for start_str, end_str in TIME_WINDOW_PATTERN.findall(time_clause):
+        start = datetime.strptime(start_str, "%Y-%m-%d").date()
+        if not end_str:
+            # End date cut off entirely: treat the window as still running.
+            end = date.max
+        elif len(end_str) == 4:
+            # Only the year survived the truncation: assume the window runs to year end.
+            end = date(int(end_str), 12, 31)
+        else:
+            end = datetime.strptime(end_str, "%Y-%m-%d").date()
+        windows.append((start, end))
+    if not windows:
+        raise ValueError(f"TIME clause has no parsable date ranges: '{time_clause[:60]}'")
+    return tuple(windows)
+
+
+def compile_condition(condition: str) -> CompiledCondition:
+    """
+    Parses a rule's 'Condition' string into typed predicates.
+
+    Args:
+        condition (str): Raw condition, e.g.
+            "Natal (Sun in 1 AND Sun conjunct Ven) AND AGE (11/17) AND TIME ((2022-04-28 to 2023-01-17))".
+
+    Returns:
+        CompiledCondition: The parsed predicates.
+
+    Raises:
+        ValueError: If the condition uses an unknown planet, has malformed AGE/TIME
+                    clauses, or contains no natal predicate at all.
+    """
+    text = condition.lower()
+
+    in_house = tuple(
+        PlanetInHouse(_check_planet(planet), frozenset(int(h) for h in houses.split('/')))
+        for planet, houses in PLANET_IN_HOUSE_PATTERN.findall(text)
+    )
+    conjunctions = tuple(
+        Conjunction(_check_planet(a), _check_planet(b)) for a, b in CONJUNCT_PATTERN.findall(text)
+    )
+    not_with = tuple(
+        NotWith(_check_planet(a), _check_planet(b)) for a, b in NOT_WITH_PATTERN.findall(text)
+    )
+    if not (in_house or conjunctions or not_with):
+        raise ValueError("No natal predicate found")
+
+    ages = None
+    age_match = AGE_PATTERN.search(text)
+    if age_match:
+        ages = frozenset(int(a.strip()) for a in age_match.group(1).split('/'))
+
+    time_windows = None
+    time_match = TIME_CLAUSE_PATTERN.search(text)
+    if time_match:
+        time_windows = _parse_time_windows(time_match.group(1))
+
+    return CompiledCondition(in_house, conjunctions, not_with, ages, time_windows)
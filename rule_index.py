@@ -0,0 +1,193 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, NamedTuple, Sequence, Set, Tuple
+from rule_compiler import CompiledCondition
+
+# The index arrays are `array("i")` when built from the sheet, or int32
+# memoryviews over the compiled artifact (see kb_artifact.py); both are
+# plain int sequences to the lookups below.
+
+
+class PostingArrays(NamedTuple):
+    offsets: Sequence[int]     # key slot k's rows are rows[offsets[k]:offsets[k + 1]]
+    rows: Sequence[int]        # Excel row numbers, every posting list back to back
+
+
+class IntervalTreeArrays(NamedTuple):
+    always_active: Sequence[int]  # rows without a TIME clause
+    centers: Sequence[int]        # per node: center day ordinal
+    lefts: Sequence[int]          # per node: child holding intervals ending before center, or -1
+    rights: Sequence[int]         # per node: child holding intervals starting after center, or -1
+    spans: Sequence[int]          # node n's intervals sit at [spans[n], spans[n + 1]) of the arrays below
+    starts: Sequence[int]         # interval start ordinals, ascending within a node
+    start_rows: Sequence[int]
+    ends: Sequence[int]           # the same intervals' end ordinals, ascending within a node
+    end_rows: Sequence[int]
+
+
+class PlanetHouseIndex:
+    """
+    Inverted index from natal predicates to the Excel rows that use them.
+
+    Keys follow the Condition grammar (short planet names):
+        (planet, house)               e.g. ("sat", 6)
+        (planet, "conjunct", other)   e.g. ("sun", "conjunct", "ven")
+        (planet, "not-with", other)   e.g. ("sun", "not-with", "mer")
+
+    Conjunct / not-with pairs are symmetric, so they are posted under both
+    orderings. Posting lists are kept in sheet order and stored back to back
+    in one flat array (see `PostingArrays`), so a compiled knowledge bank
+    artifact can serve them straight from a memory map.
+    """
+
+    def __init__(self, keys: List[tuple], arrays: "PostingArrays"):
+        self.keys = keys
+        self.arrays = arrays
+        self._slots = {key: slot for slot, key in enumerate(keys)}
+
+    @classmethod
+    def from_compiled(cls, compiled: Dict[int, CompiledCondition]) -> "PlanetHouseIndex":
+        postings = defaultdict(list)
+        for idx, condition in compiled.items():
+            keys = set()
+            for predicate in condition.in_house:
+                for house in predicate.houses:
+                    keys.add((predicate.planet, house))
+            for predicate in condition.conjunctions:
+                keys.add((predicate.planet, "conjunct", predicate.other))
+                keys.add((predicate.other, "conjunct", predicate.planet))
+            for predicate in condition.not_with:
+                keys.add((predicate.planet, "not-with", predicate.other))
+                keys.add((predicate.other, "not-with", predicate.planet))
+            for key in keys:
+                postings[key].append(idx)
+
+        offsets, rows = array("i", [0]), array("i")
+        for key_rows in postings.values():
+            rows.extend(key_rows)
+            offsets.append(len(rows))
+        return cls(list(postings), PostingArrays(offsets, rows))
+
+    def lookup(self, key: tuple) -> Sequence[int]:
+        slot = self._slots.get(key)
+        if slot is None:
+            return ()
+        offsets = self.arrays.offsets
+        return self.arrays.rows[offsets[slot]:offsets[slot + 1]]
+
+    def candidates_for_planet(self, planet: str, positions: Dict[str, int]) -> Set[int]:
+        """
+        Returns the rows whose natal predicates involving `planet` hold for the chart.
+
+        Args:
+            planet (str): Short planet name (e.g. "sat").
+            positions (dict): Chart keyed by short planet name, e.g. {"sat": 11, ...}.
+        """
+        if planet not in positions:
+            return set()
+        house = positions[planet]
+        candidates = set(self.lookup((planet, house)))
+        for other, other_house in positions.items():
+            if other == planet:
+                continue
+            relation = "conjunct" if other_house == house else "not-with"
+            candidates.update(self.lookup((planet, relation, other)))
+        return candidates
+
+
+def _flatten_interval_tree(intervals: List[Tuple[int, int, int]], always_active: List[int]) -> "IntervalTreeArrays":
+    """Builds a centered interval tree over (start, end, row) day ordinals, laid out as flat arrays."""
+    tree = IntervalTreeArrays(*(array("i") for _ in IntervalTreeArrays._fields))
+    tree.always_active.extend(always_active)
+    tree.spans.append(0)
+
+    def build(intervals) -> int:
+        if not intervals:
+            return -1
+        endpoints = sorted(point for start, end, _ in intervals for point in (start, end))
+        center = endpoints[len(endpoints) // 2]
+        left, right, overlapping = [], [], []
+        for interval in intervals:
+            if interval[1] < center:
+                left.append(interval)
+            elif interval[0] > center:
+                right.append(interval)
+            else:
+                overlapping.append(interval)
+
+        node = len(tree.centers)
+        tree.centers.append(center)
+        tree.lefts.append(-1)
+        tree.rights.append(-1)
+        for start, _, idx in sorted(overlapping, key=lambda interval: interval[0]):
+            tree.starts.append(start)
+            tree.start_rows.append(idx)
+        for _, end, idx in sorted(overlapping, key=lambda interval: interval[1]):
+            tree.ends.append(end)
+            tree.end_rows.append(idx)
+        tree.spans.append(len(tree.starts))
+        tree.lefts[node] = build(left)
+        tree.rights[node] = build(right)
+        return node
+
+    build(intervals)
+    return tree
+
+
+class TimeWindowIndex:
+    """
+    Centered interval tree over every rule's TIME (dasha) windows.
+
+    `active_on(day)` returns the Excel rows whose condition is satisfied on
+    that day: rows with a window containing it plus rows without a TIME clause.
+    Results are memoized per day, so a day's set is computed once and every
+    later request on that day is a single dict lookup.
+
+    The tree is stored as flat arrays of day ordinals (see `IntervalTreeArrays`)
+    rather than node objects, so it can be served from a memory-mapped artifact.
+    """
+
+    def __init__(self, arrays: "IntervalTreeArrays"):
+        self.arrays = arrays
+        self.always_active = frozenset(arrays.always_active)
+        self.window_count = len(arrays.starts)
+        self.active_on = lru_cache(maxsize=8)(self._active_on)
+
+    @classmethod
+    def from_compiled(cls, compiled: Dict[int, CompiledCondition]) -> "TimeWindowIndex":
+        intervals = []
+        always_active = []
+        for idx, condition in compiled.items():
+            if condition.time_windows is None:
+                always_active.append(idx)
+                continue
+            for start, end in condition.time_windows:
+                # A few windows in the sheet are inverted (start after end); they
+                # can never contain a day, so they are left out of the tree.
+                if start <= end:
+                    intervals.append((start.toordinal(), end.toordinal(), idx))
+        return cls(_flatten_interval_tree(intervals, always_active))
+
+    def _active_on(self, day: date) -> FrozenSet[int]:
+        tree = self.arrays
+        day_ordinal = day.toordinal()
+        active = set(self.always_active)
+        node = 0 if len(tree.centers) else -1
+        while node != -1:
+            low, high = tree.spans[node], tree.spans[node + 1]
+            center = tree.centers[node]
+            if day_ordinal < center:
+                # Every interval here ends at or after center, so it holds iff it has started.
+                active.update(tree.start_rows[low:bisect_right(tree.starts, day_ordinal, low, high)])
+                node = tree.lefts[node]
+            elif day_ordinal > center:
+                # Every interval here starts at or before center, so it holds iff it has not ended.
+                active.update(tree.end_rows[bisect_left(tree.ends, day_ordinal, low, high):high])
+                node = tree.rights[node]
+            else:
+                active.update(tree.start_rows[low:high])
+                break
+        return frozenset(active)
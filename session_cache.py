@@ -0,0 +1,105 @@
+import json
+import os
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, Iterator
+
+# Memory budget for resident sessions (approximate serialized size of their db_records).
+SESSION_CACHE_MAX_BYTES = int(os.getenv("SESSION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+class SessionCache:
+    """
+    Bounded, LRU-ordered replacement for the plain `user_data_store` dict.
+
+    Each entry is a session ({"db_record": ..., "session_state": ...}) keyed by
+    `mob`. When the resident sessions exceed `max_bytes`, the least recently
+    used *idle* sessions are spilled through `spill(mob, session)` (to the
+    persistent store) and dropped from memory; sessions pinned by an open
+    WebSocket are never evicted. A spilled user is rehydrated from the
+    persistent store on reconnect.
+
+    Sizes are estimated from the JSON size of `db_record` and refreshed via
+    `update_size` whenever a record changes. `resident_count` and
+    `resident_bytes` are exposed as gauges.
+    """
+
+    def __init__(self, max_bytes: int, spill: Callable[[str, Dict[str, Any]], None]):
+        self.max_bytes = max_bytes
+        self._spill = spill
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._pins: Counter = Counter()
+        self.resident_bytes = 0
+        self.evictions = 0
+
+    def __contains__(self, mob: str) -> bool:
+        return mob in self._sessions
+
+    def __getitem__(self, mob: str) -> Dict[str, Any]:
+        session = self._sessions[mob]
+        self._sessions.move_to_end(mob)
+        return session
+
+    def __setitem__(self, mob: str, session: Dict[str, Any]):
+        self._sessions[mob] = session
+        self._sessions.move_to_end(mob)
+        self.update_size(mob)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._sessions))
+
+    def __repr__(self) -> str:
+        return f"SessionCache(resident_count={self.resident_count}, resident_bytes={self.resident_bytes})"
+
+    def get(self, mob: str, default=None):
+        return self[mob] if mob in self._sessions else default
+
+    @property
+    def resident_count(self) -> int:
+        return len(self._sessions)
+
+    def pin(self, mob: str):
+        """Marks the session as in use by a connection, protecting it from eviction."""
+        self._pins[mob] += 1
+
+    def unpin(self, mob: str):
+        self._pins[mob] -= 1
+        if self._pins[mob] <= 0:
+            del self._pins[mob]
+        self._evict_over_budget()
+
+    def update_size(self, mob: str):
+        """Re-measures a session after its db_record changed, evicting others if over budget."""
+        session = self._sessions.get(mob)
+        if session is None:
+            return
+        size = len(json.dumps(session.get("db_record", {}), ensure_ascii=False).encode("utf-8"))
+        self.resident_bytes += size - self._sizes.get(mob, 0)
+        self._sizes[mob] = size
+        self._evict_over_budget()
+
+    def _evict_over_budget(self):
+        if self.resident_bytes <= self.max_bytes:
+            return
+        # Oldest first; pinned (connected) sessions are skipped.
+        for mob in list(self._sessions):
+            if self.resident_bytes <= self.max_bytes:
+                break
+            if self._pins.get(mob):
+                continue
+            session = self._sessions.pop(mob)
+            self.resident_bytes -= self._sizes.pop(mob, 0)
+            self.evictions += 1
+            self._spill(mob, session)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "resident_count": self.resident_count,
+            "resident_bytes": self.resident_bytes,
+            "max_bytes": self.max_bytes,
+            "pinned": len(self._pins),
+            "evictions": self.evictions,
+        }
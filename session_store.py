@@ -0,0 +1,103 @@
+import asyncio
+import time
+from typing import Any, Dict
+from metrics import SESSION_CACHE_EVICTIONS
+from session_cache import SESSION_CACHE_MAX_BYTES, SessionCache
+from user_database import UserDatabase
+
+# session_state keys that belong to the user rather than to one worker, so they are
+# persisted with the profile. Everything else in session_state (precomputed chart
+# rules and their task) is a per-worker cache that is rebuilt on demand.
+PERSISTED_SESSION_STATE = ("details_request_pending", "pending_question")
+
+
+def _new_session_state() -> Dict[str, Any]:
+    return {"details_request_pending": False, "pending_question": None}
+
+
+class SessionStore:
+    """
+    Session and profile state for /ws connections, safe to share between
+    uvicorn workers.
+
+    The process-shared backend is the SQLite (WAL) user database; each worker
+    keeps the sessions it has served in a bounded `SessionCache` as a read
+    cache. Every save stamps the session with a new version (the write time
+    in nanoseconds, so stamps from different workers are ordered), and
+    `refresh` compares the cached stamp with the stored one, reloading the
+    session when another worker has written a newer version since. A session
+    with a write still queued in this worker is not reloaded; the newest
+    stamp wins once both writes have been flushed.
+
+    Sessions are dicts: {"db_record": ..., "session_state": ..., "version": int}.
+    """
+
+    def __init__(self, database: UserDatabase, max_bytes: int = SESSION_CACHE_MAX_BYTES):
+        self.database = database
+        self.cache = SessionCache(max_bytes, spill=self._spill)
+
+    def __contains__(self, mob: str) -> bool:
+        return mob in self.cache
+
+    def __getitem__(self, mob: str) -> Dict[str, Any]:
+        return self.cache[mob]
+
+    async def refresh(self, mob: str) -> Dict[str, Any]:
+        """
+        Returns the up-to-date session for `mob`, from the cache when its
+        version is current, else loaded from the database (an empty profile
+        for unknown users). Called when a socket connects and before every turn.
+        """
+        session = self.cache.get(mob)
+        if session is not None:
+            if self.database.has_pending_write(mob):
+                return session
+            stored_version = await self.database.stored_version(mob)
+            if stored_version is None or stored_version <= session["version"]:
+                return session
+
+        entry = await self.database.load_entry(mob)
+        # Another connection may have created the session while we were reading.
+        session = self.cache.get(mob)
+        if session is None:
+            session = {"db_record": None, "session_state": _new_session_state(), "version": 0}
+        if entry is None:
+            session["db_record"] = {"basic_data": {}, "on_demand_data": {}, "predictions": []}
+        else:
+            # Updated in place, so the worker-local parts of session_state survive a reload.
+            session["db_record"] = entry.db_record
+            session["session_state"].update(
+                {key: entry.session_state[key] for key in PERSISTED_SESSION_STATE if key in entry.session_state}
+            )
+            session["version"] = entry.version
+        self.cache[mob] = session
+        return session
+
+    def save(self, mob: str):
+        """Stamps the session with a new version and queues it for the shared store."""
+        session = self.cache[mob]
+        session["version"] = max(time.time_ns(), session["version"] + 1)
+        self._schedule_save(mob, session)
+        self.cache.update_size(mob)
+
+    def _schedule_save(self, mob: str, session: Dict[str, Any]):
+        persisted_state = {key: session["session_state"].get(key) for key in PERSISTED_SESSION_STATE}
+        self.database.schedule_save(mob, session["db_record"], persisted_state, session["version"])
+
+    def _spill(self, mob: str, session: Dict[str, Any]):
+        # Written with its existing stamp, so it never overrides a newer version from another worker.
+        self._schedule_save(mob, session)
+        SESSION_CACHE_EVICTIONS.inc()
+
+    def pin(self, mob: str):
+        """Keeps the session resident while a connection uses it."""
+        self.cache.pin(mob)
+
+    async def release(self, mob: str):
+        """
+        Unpins the session when its connection closes and flushes queued
+        writes, so a reconnect landing on any worker sees them.
+        """
+        self.cache.unpin(mob)
+        # Shielded: the connection's task is often being cancelled as the socket closes.
+        await asyncio.shield(self.database.flush())
@@ -0,0 +1,264 @@
+import math
+import re
+import unicodedata
+from array import array
+from collections import Counter, defaultdict
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+# Character n-gram sizes used for both the Result texts and the user query.
+NGRAM_RANGE = (2, 4)
+
+# Common English / Hinglish words users type, mapped to the Devanagari vocabulary
+# of the knowledge bank's 'Result' column. Words not listed here fall back to
+# phonetic transliteration (see `transliterate_roman_word`).
+HINGLISH_LEXICON = {
+    # health
+    "health": "सेहत स्वास्थ्य", "sehat": "सेहत", "sehet": "सेहत", "swasthya": "स्वास्थ्य",
+    "bimari": "बीमारी", "illness": "बीमारी", "disease": "बीमारी", "tabiyat": "तबीयत",
+    # money / finance
+    "money": "आर्थिक धन पैसा", "finance": "आर्थिक", "financial": "आर्थिक", "paisa": "पैसा आर्थिक",
+    "paise": "पैसा आर्थिक", "dhan": "धन आर्थिक", "wealth": "धन आर्थिक", "arthik": "आर्थिक",
+    "investment": "आर्थिक निवेश", "nivesh": "निवेश आर्थिक",
+    # business / work
+    "business": "व्यापार", "vyapar": "व्यापार", "vyaapar": "व्यापार", "profit": "लाभ", "labh": "लाभ",
+    "fayda": "लाभ", "job": "नौकरी", "naukri": "नौकरी", "nokri": "नौकरी", "career": "नौकरी कार्य",
+    "work": "कार्य", "kaam": "कार्य", "karya": "कार्य", "promotion": "नौकरी बदलाव",
+    "opportunity": "अवसर", "avsar": "अवसर", "mauka": "अवसर",
+    # family / home / children
+    "family": "परिवार", "parivar": "परिवार", "pariwar": "परिवार", "home": "घर", "ghar": "घर",
+    "house": "घर", "children": "संतान", "child": "संतान", "kids": "संतान", "bachche": "संतान",
+    "bacche": "संतान", "santan": "संतान", "santaan": "संतान", "beta": "संतान", "beti": "संतान",
+    # relationships
+    "friend": "मित्र", "friends": "मित्र", "dost": "मित्र", "dosti": "मित्र", "mitra": "मित्र",
+    "love": "प्रेम संबंध", "pyar": "प्रेम", "pyaar": "प्रेम", "prem": "प्रेम", "relationship": "संबंध",
+    "marriage": "विवाह", "shaadi": "विवाह", "shadi": "विवाह", "vivah": "विवाह",
+    "partner": "संबंध", "fight": "विवाद", "jhagda": "विवाद", "jhagra": "विवाद", "dispute": "विवाद",
+    "cheating": "धोखा", "dhokha": "धोखा", "dhoka": "धोखा", "fraud": "धोखा",
+    # travel / new ventures
+    "travel": "यात्रा", "trip": "यात्रा", "journey": "यात्रा", "yatra": "यात्रा", "safar": "यात्रा",
+    "abroad": "यात्रा", "videsh": "यात्रा", "start": "शुरू", "shuru": "शुरू", "new": "नया", "naya": "नया",
+    "decision": "निर्णय", "faisla": "निर्णय", "change": "बदलाव", "badlav": "बदलाव",
+    "life": "जीवन", "jeevan": "जीवन", "jivan": "जीवन", "time": "समय", "samay": "समय",
+}
+
+# Roman-script filler words that carry no topic and would only add noise n-grams.
+ROMAN_STOPWORDS = {
+    "a", "an", "the", "is", "am", "are", "be", "will", "my", "me", "i", "how", "what", "when",
+    "in", "of", "for", "to", "and", "or", "with", "about", "does", "do", "can", "should", "next",
+    "mera", "meri", "mere", "mujhe", "main", "mai", "mein", "ka", "ki", "ke", "ko", "se", "hai",
+    "hain", "ho", "hoga", "hogi", "honge", "kya", "kaisa", "kaisi", "kaise", "kesa", "kesi", "kese",
+    "rahega", "rahegi", "rahenge", "raha", "rahi", "agle", "agla", "is", "iss", "us", "aur", "bhi",
+    "mahine", "saal", "din", "abhi", "ab", "kab", "kyun", "batao", "bataiye", "please",
+}
+
+# Greedy Roman -> Devanagari tables (longest match first).
+_ROMAN_VOWELS = [
+    ("aa", "आ", "ा"), ("ai", "ऐ", "ै"), ("au", "औ", "ौ"), ("ee", "ई", "ी"), ("ii", "ई", "ी"),
+    ("oo", "ऊ", "ू"), ("uu", "ऊ", "ू"), ("a", "अ", ""), ("i", "इ", "ि"), ("u", "उ", "ु"),
+    ("e", "ए", "े"), ("o", "ओ", "ो"),
+]
+_ROMAN_CONSONANTS = [
+    ("chh", "छ"), ("ksh", "क्ष"), ("kh", "ख"), ("gh", "घ"), ("ch", "च"), ("jh", "झ"), ("th", "थ"),
+    ("dh", "ध"), ("ph", "फ"), ("bh", "भ"), ("sh", "श"), ("k", "क"), ("g", "ग"), ("c", "क"),
+    ("j", "ज"), ("t", "त"), ("d", "द"), ("n", "न"), ("p", "प"), ("b", "ब"), ("m", "म"),
+    ("y", "य"), ("r", "र"), ("l", "ल"), ("v", "व"), ("w", "व"), ("s", "स"), ("h", "ह"),
+    ("f", "फ"), ("z", "ज"), ("q", "क"), ("x", "क्स"),
+]
+_VIRAMA = "्"
+_ANUSVARA = "ं"
+
+_TOKEN_PATTERN = re.compile(r'[a-z]+|[ऀ-ॿ]+|\d+')
+# Nukta and chandrabindu variants are folded so spelling differences still share n-grams.
+_DEVANAGARI_FOLD = str.maketrans({"़": None, "ँ": _ANUSVARA})
+
+
+def _match_prefix(table, word: str, pos: int):
+    for entry in table:
+        if word.startswith(entry[0], pos):
+            return entry
+    return None
+
+
+def transliterate_roman_word(word: str) -> str:
+    """
+    Approximate phonetic transliteration of one Romanized Hindi word into Devanagari,
+    e.g. "sehat" -> "सेहत", "kaisa" -> "कैसा". Word-final "a" is read as "aa",
+    which is how Hinglish usually spells it ("kaisa", "paisa").
+    """
+    output = []
+    pos = 0
+    after_consonant = False
+    while pos < len(word):
+        vowel = _match_prefix(_ROMAN_VOWELS, word, pos)
+        if vowel:
+            roman, independent, matra = vowel
+            if roman == "a" and pos == len(word) - 1 and after_consonant:
+                matra = "ा"
+            output.append(matra if after_consonant else independent)
+            pos += len(roman)
+            after_consonant = False
+            continue
+        consonant = _match_prefix(_ROMAN_CONSONANTS, word, pos)
+        if consonant is None:
+            pos += 1
+            continue
+        roman, letter = consonant
+        next_pos = pos + len(roman)
+        next_is_consonant = next_pos < len(word) and _match_prefix(_ROMAN_VOWELS, word, next_pos) is None
+        if roman in ("n", "m") and next_is_consonant and output and not after_consonant:
+            # Nasal after a vowel and before a consonant is written as anusvara (sambandh -> संबंध).
+            output.append(_ANUSVARA)
+            after_consonant = False
+        else:
+            if after_consonant:
+                output.append(_VIRAMA)
+            output.append(letter)
+            after_consonant = True
+        pos = next_pos
+    return "".join(output)
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normalizes English / Hinglish / Devanagari text into a single Devanagari form.
+
+    Roman filler words are dropped; other Roman words are replaced by their
+    lexicon entry or, failing that, by a
+    phonetic transliteration; Devanagari is NFC-normalized with nukta and
+    chandrabindu folded. Punctuation is dropped.
+    """
+    text = unicodedata.normalize("NFC", text.lower())
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text):
+        if token.isascii() and token.isalpha():
+            if token in ROMAN_STOPWORDS:
+                continue
+            token = HINGLISH_LEXICON.get(token) or transliterate_roman_word(token)
+        tokens.append(token.translate(_DEVANAGARI_FOLD))
+    return " ".join(tokens)
+
+
+def char_ngrams(text: str) -> Counter:
+    """Counts word-bounded character n-grams (like scikit-learn's 'char_wb')."""
+    counts = Counter()
+    n_min, n_max = NGRAM_RANGE
+    for word in text.split():
+        padded = f" {word} "
+        for n in range(n_min, n_max + 1):
+            for i in range(len(padded) - n + 1):
+                counts[padded[i:i + n]] += 1
+    return counts
+
+
+def cosine_similarity(a: Dict[int, float], b: Dict[int, float]) -> float:
+    """Cosine of two L2-normalized sparse vectors (as returned by `ResultSimilarityIndex.vector`)."""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(gram_id, 0.0) for gram_id, weight in a.items())
+
+
+class SimilarityArrays(NamedTuple):
+    doc_offsets: Sequence[int]      # document d's rows are doc_rows[doc_offsets[d]:doc_offsets[d + 1]]
+    doc_rows: Sequence[int]         # Excel row numbers of each distinct Result text
+    idf: Sequence[float]            # per n-gram id
+    posting_offsets: Sequence[int]  # n-gram g's postings are at [posting_offsets[g], posting_offsets[g + 1])
+    posting_docs: Sequence[int]
+    posting_weights: Sequence[float]
+
+
+class ResultSimilarityIndex:
+    """
+    Character n-gram TF-IDF index over the knowledge bank's 'Result' texts.
+
+    Identical Result texts are indexed once and mapped back to all of their
+    Excel rows. Vectors are stored as a sparse inverted index
+    (n-gram -> [(doc_id, weight)]) of L2-normalized sublinear TF-IDF weights,
+    so a query's cosine score only touches documents sharing an n-gram with it.
+    The n-gram vocabulary is a list of strings; everything else lives in flat
+    arrays (see `SimilarityArrays`) that a compiled artifact can memory-map.
+    """
+
+    def __init__(self, grams: List[str], arrays: SimilarityArrays):
+        self.grams = grams
+        self.gram_ids = {gram: gram_id for gram_id, gram in enumerate(grams)}
+        self.arrays = arrays
+        self.doc_count = len(arrays.doc_offsets) - 1
+
+    @classmethod
+    def from_results(cls, results: Dict[int, str]) -> "ResultSimilarityIndex":
+        doc_ids: Dict[str, int] = {}
+        doc_rows: List[List[int]] = []
+        for idx, result in results.items():
+            normalized = normalize_text(result)
+            if not normalized:
+                continue
+            if normalized not in doc_ids:
+                doc_ids[normalized] = len(doc_rows)
+                doc_rows.append([])
+            doc_rows[doc_ids[normalized]].append(idx)
+
+        doc_counts = [char_ngrams(text) for text in doc_ids]
+        document_frequency = Counter()
+        for counts in doc_counts:
+            document_frequency.update(counts.keys())
+        doc_total = len(doc_counts)
+        grams = list(document_frequency)
+        arrays = SimilarityArrays(
+            array("i", [0]), array("i"),
+            array("d", (math.log((1 + doc_total) / (1 + df)) + 1.0 for df in document_frequency.values())),
+            array("i", [0]), array("i"), array("d"),
+        )
+        for rows in doc_rows:
+            arrays.doc_rows.extend(rows)
+            arrays.doc_offsets.append(len(arrays.doc_rows))
+
+        index = cls(grams, arrays)
+        postings = [[] for _ in grams]
+        for doc_id, counts in enumerate(doc_counts):
+            for gram_id, weight in index._weigh(counts).items():
+                postings[gram_id].append((doc_id, weight))
+        for gram_postings in postings:
+            for doc_id, weight in gram_postings:
+                arrays.posting_docs.append(doc_id)
+                arrays.posting_weights.append(weight)
+            arrays.posting_offsets.append(len(arrays.posting_docs))
+        return index
+
+    def _weigh(self, counts: Counter) -> Dict[int, float]:
+        """L2-normalized TF-IDF weights keyed by n-gram id; n-grams outside the vocabulary are dropped."""
+        idf = self.arrays.idf
+        weights = {}
+        for gram, tf in counts.items():
+            gram_id = self.gram_ids.get(gram)
+            if gram_id is not None:
+                weights[gram_id] = (1.0 + math.log(tf)) * idf[gram_id]
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        if not norm:
+            return {}
+        return {gram_id: w / norm for gram_id, w in weights.items()}
+
+    def vector(self, text: str) -> Dict[int, float]:
+        """Returns the normalized TF-IDF vector of any text (n-gram id -> weight) in this index's space."""
+        return self._weigh(char_ngrams(normalize_text(text)))
+
+    def search(self, query: str, top_k: int, min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """
+        Returns up to `top_k` (Excel row number, cosine score) pairs for the query,
+        best first. Ties are broken by row number so results are stable.
+        """
+        arrays = self.arrays
+        query_weights = self.vector(query)
+        doc_scores = defaultdict(float)
+        for gram_id, query_weight in query_weights.items():
+            for position in range(arrays.posting_offsets[gram_id], arrays.posting_offsets[gram_id + 1]):
+                doc_scores[arrays.posting_docs[position]] += query_weight * arrays.posting_weights[position]
+
+        doc_offsets = arrays.doc_offsets
+        ranked_rows = [
+            (idx, score)
+            for doc_id, score in doc_scores.items()
+            if score > min_score
+            for idx in arrays.doc_rows[doc_offsets[doc_id]:doc_offsets[doc_id + 1]]
+        ]
+        ranked_rows.sort(key=lambda item: (-item[1], item[0]))
+        return ranked_rows[:top_k]
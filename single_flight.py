@@ -0,0 +1,56 @@
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Tuple
+from metrics import LLM_CALLS_COALESCED
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while a call for a key is in flight,
+    later calls with the same key wait for it and share its result (or
+    exception) instead of running again. Nothing is cached; once the call
+    finishes, the next one for that key runs anew.
+
+    Meant for blocking calls made from worker threads (e.g. via
+    asyncio.to_thread), and only worth it where keys really collide: the
+    re-rank prompt depends on nothing but the question and its candidates.
+    """
+
+    def __init__(self, call: str):
+        # Call-site label for LLM_CALLS_COALESCED.
+        self.call = call
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Hashable, Future] = {}
+
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        """Returns the key's in-flight future and whether the caller has to run the call."""
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                LLM_CALLS_COALESCED.labels(self.call).inc()
+                return future, False
+            future = Future()
+            self._in_flight[key] = future
+            return future, True
+
+    def _run(self, key: Hashable, future: Future, func: Callable, args: tuple):
+        try:
+            result = func(*args)
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+        else:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_result(result)
+
+    def do(self, key: Hashable, func: Callable, *args) -> Any:
+        """Runs `func(*args)` in the calling thread, unless an identical call is already in flight."""
+        future, leader = self._join(key)
+        if leader:
+            self._run(key, future, func, args)
+        return future.result()
+
+    def in_flight(self) -> int:
+        return len(self._in_flight)
@@ -0,0 +1,206 @@
+import aiosqlite
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+from datetime import datetime, timezone
+from typing import Any, Dict, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+DATABASE_FILE = os.getenv("USER_DB_FILE", "user_data.sqlite")
+
+# How long queued writes may wait before being flushed in one transaction.
+FLUSH_INTERVAL_SECONDS = float(os.getenv("USER_DB_FLUSH_INTERVAL_SECONDS", "0.5"))
+# Longest wait between retries of a failed flush (the wait doubles from FLUSH_INTERVAL_SECONDS).
+FLUSH_RETRY_MAX_SECONDS = float(os.getenv("USER_DB_FLUSH_RETRY_MAX_SECONDS", "30"))
+
+
+class StoredUser(NamedTuple):
+    db_record: Dict[str, Any]
+    session_state: Dict[str, Any]  # the persisted part of the session state (see session_store.py)
+    version: int
+
+
+class _PendingWrite(NamedTuple):
+    db_record: Dict[str, Any]
+    session_state: Dict[str, Any]
+    version: int
+
+
+class UserDatabase:
+    """
+    Async SQLite store for user records (`db_record`), one row per `mob`.
+
+    The database runs in WAL mode. Writes are write-behind: `schedule_save`
+    only marks the record dirty, and a background task flushes all dirty
+    records in a single batched transaction every FLUSH_INTERVAL_SECONDS.
+    Several saves of the same `mob` within one interval are coalesced into
+    one row write, and a chat turn never waits on disk I/O.
+
+    The file can be shared by several processes (uvicorn workers). Every row
+    carries a version stamp chosen by its writer (see `session_store.py`),
+    and a flush never overwrites a row whose stored version is newer, so a
+    delayed write from one worker cannot clobber a later one from another.
+    """
+
+    def __init__(self, path: str = DATABASE_FILE, flush_interval: float = FLUSH_INTERVAL_SECONDS):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._connection: Optional[aiosqlite.Connection] = None
+        self._pending: Dict[str, _PendingWrite] = {}
+        self._wakeup = asyncio.Event()
+        self._writer_task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._closing = False
+        # Extra wait before the writer's next flush after failed ones (0 while flushes succeed).
+        self._retry_delay = 0.0
+
+    async def open(self):
+        self._connection = await aiosqlite.connect(self.path)
+        await self._connection.execute("PRAGMA journal_mode=WAL")
+        await self._connection.execute("PRAGMA synchronous=NORMAL")
+        await self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                mob TEXT PRIMARY KEY,
+                db_record TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 0,
+                session_state TEXT
+            )
+            """
+        )
+        # Databases created before versioning lack the last two columns.
+        async with self._connection.execute("PRAGMA table_info(users)") as cursor:
+            columns = {row[1] for row in await cursor.fetchall()}
+        if "version" not in columns:
+            await self._add_column("version INTEGER NOT NULL DEFAULT 0")
+        if "session_state" not in columns:
+            await self._add_column("session_state TEXT")
+        await self._connection.commit()
+        self._closing = False
+        # Flushes also run outside the writer (on disconnect, on close); one at a time,
+        # so `close()` never shuts the connection under a flush still in progress.
+        self._flush_lock = asyncio.Lock()
+        self._writer_task = asyncio.create_task(self._writer())
+        logger.info("User database opened at '%s'.", self.path)
+
+    async def _add_column(self, definition: str):
+        # Every uvicorn worker runs this migration at startup; a worker that lost
+        # the race finds the column already added.
+        try:
+            await self._connection.execute(f"ALTER TABLE users ADD COLUMN {definition}")
+        except sqlite3.OperationalError as e:
+            if "duplicate column name" not in str(e):
+                raise
+
+    async def close(self):
+        """Flushes every pending write, then closes the connection."""
+        if self._connection is None:
+            return
+        self._closing = True
+        self._wakeup.set()
+        if self._writer_task is not None:
+            await self._writer_task
+            self._writer_task = None
+        await self.flush()
+        await self._connection.close()
+        self._connection = None
+
+    async def load(self, mob: str) -> Optional[Dict[str, Any]]:
+        """Returns the stored `db_record` for `mob`, or None if the user is unknown."""
+        entry = await self.load_entry(mob)
+        return entry.db_record if entry else None
+
+    async def load_entry(self, mob: str) -> Optional[StoredUser]:
+        """Returns the stored record, persisted session state and version for `mob`, or None."""
+        if mob in self._pending:
+            return StoredUser(*self._pending[mob])
+        if self._connection is None:
+            return None
+        async with self._connection.execute(
+            "SELECT db_record, session_state, version FROM users WHERE mob = ?", (mob,)
+        ) as cursor:
+            row = await cursor.fetchone()
+        if row is None:
+            return None
+        return StoredUser(json.loads(row[0]), json.loads(row[1]) if row[1] else {}, row[2])
+
+    async def stored_version(self, mob: str) -> Optional[int]:
+        """Returns the version of `mob`'s row in the database (ignoring queued writes), or None."""
+        if self._connection is None:
+            return None
+        async with self._connection.execute("SELECT version FROM users WHERE mob = ?", (mob,)) as cursor:
+            row = await cursor.fetchone()
+        return row[0] if row else None
+
+    def has_pending_write(self, mob: str) -> bool:
+        return mob in self._pending
+
+    def schedule_save(self, mob: str, db_record: Dict[str, Any], session_state: Optional[Dict[str, Any]] = None,
+                      version: int = 0):
+        """Queues `db_record` (and the persisted session state) for the next batched flush. Never blocks."""
+        self._pending[mob] = _PendingWrite(db_record, session_state or {}, version)
+        self._wakeup.set()
+
+    async def flush(self):
+        """Writes all queued records in one transaction."""
+        if self._flush_lock is None:
+            return
+        async with self._flush_lock:
+            await self._flush_pending()
+
+    async def _flush_pending(self):
+        if not self._pending or self._connection is None:
+            return
+        batch, self._pending = self._pending, {}
+        now = datetime.now(timezone.utc).isoformat()
+        # Serialized here, on the event loop, so each record is a consistent snapshot.
+        rows = [
+            (mob, json.dumps(write.db_record, ensure_ascii=False), now, write.version,
+             json.dumps(write.session_state, ensure_ascii=False))
+            for mob, write in batch.items()
+        ]
+        try:
+            await self._connection.executemany(
+                """
+                INSERT INTO users (mob, db_record, updated_at, version, session_state) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(mob) DO UPDATE SET
+                    db_record = excluded.db_record, updated_at = excluded.updated_at,
+                    version = excluded.version, session_state = excluded.session_state
+                WHERE excluded.version >= users.version
+                """,
+                rows,
+            )
+            await self._connection.commit()
+            self._retry_delay = 0.0
+        except asyncio.CancelledError:
+            # The caller was cancelled mid-write; keep the batch for the next flush.
+            self._requeue(batch)
+            raise
+        except Exception as e:
+            self._retry_delay = min(max(self._retry_delay * 2, self.flush_interval), FLUSH_RETRY_MAX_SECONDS)
+            logger.error("Failed to flush %d user records: %s. Will retry in %.1fs.", len(rows), e, self._retry_delay)
+            self._requeue(batch)
+            # Nothing else may wake the writer on an idle server.
+            self._wakeup.set()
+
+    def _requeue(self, batch: Dict[str, _PendingWrite]):
+        # Without overwriting anything saved again in the meantime.
+        for mob, write in batch.items():
+            self._pending.setdefault(mob, write)
+
+    async def _writer(self):
+        while not self._closing:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if not self._closing:
+                # Let more saves accumulate so they land in the same transaction
+                # (and back off while flushes are failing).
+                await asyncio.sleep(max(self.flush_interval, self._retry_delay))
+            await self.flush()
+
+
+user_database = UserDatabase()